@@ -16,6 +16,7 @@ from serial.tools import list_ports
 
 NUM_OF_SENSORS = 2  # ! Number of sensors - check main.cpp for number expected
 BUFFER_SIZE = 1024  # Buffer size for serial port reading
+READ_TIMEOUT = 0.1  # Longest a blocking read waits for data before the reader re-checks stop_thread (s)
 RECORD_DELAY = 3000  # Delay before recording starts (ms)
 RECORD_DURATION = 5000  # Duration of recording (ms)
 
@@ -50,30 +51,42 @@ class HighPassFilter:
 
 class SerialReader:
     def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
+        self.ser = serial.Serial(port, baud_rate, timeout=READ_TIMEOUT)
         self.ser.flushInput()
         self.data_queue = Queue()
         self.stop_thread = False
         self.NUM_OF_SENSORS = NUM_OF_SENSORS
+        self.line_buffer = bytearray()  # Partial line carried over to the next read
         self.thread = Thread(target=self.read_from_serial)
         self.thread.start()
 
     def read_from_serial(self) -> None:
         while not self.stop_thread:
             try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
-                        raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
-                    self.data_queue.put(data)
+                # Blocks until at least one byte arrives or READ_TIMEOUT passes, then takes everything buffered
+                self.line_buffer += self.ser.read(self.ser.in_waiting or 1)
+                end = self.line_buffer.rfind(b"\n")
+                if end < 0:
+                    continue
+                lines = self.line_buffer[:end].split(b"\n")
+                del self.line_buffer[:end + 1]
+                for line in lines:
+                    self.parse_line(line)
             except (OSError, serial.SerialException) as e:
                 logging.error("Error reading from serial port", exc_info=True)
                 break
-            except ValueError as e:
-                logging.error(e, exc_info=True)
+
+    def parse_line(self, line: bytes) -> None:
+        try:
+            line = line.decode("utf-8").strip()
+            if not line:
+                return
+            data = list(map(float, line.split(",")))
+            if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
+                raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
+            self.data_queue.put(data)
+        except ValueError as e:
+            logging.error(e, exc_info=True)
 
     def stop(self) -> None:
         self.stop_thread = True
@@ -7,11 +7,14 @@ from typing import List, Optional
 
 logging.basicConfig(level=logging.INFO)
 
+READ_TIMEOUT = 0.1  # Longest a blocking read waits for data before the reader re-checks self.reading (s)
+
 class SerialReader:
     def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int):
         try:
-            self.ser = serial.Serial(port, baud_rate, timeout=1)
+            self.ser = serial.Serial(port, baud_rate, timeout=READ_TIMEOUT)
             self.NUM_OF_SENSORS = NUM_OF_SENSORS
+            self.line_buffer = bytearray()  # Partial line carried over to the next read
             self.data_queue = deque(maxlen=1000)  # Stores recent data for processing
             self.reading = True
             self.thread = threading.Thread(target=self.read_from_serial)
@@ -24,9 +27,15 @@ class SerialReader:
     def read_from_serial(self):
         while self.reading:
             try:
-                if self.ser.in_waiting:
-                    data = self.ser.readline().decode('utf-8').strip()
-                    values = data.split(',')
+                # Blocks until at least one byte arrives or READ_TIMEOUT passes, then takes everything buffered
+                self.line_buffer += self.ser.read(self.ser.in_waiting or 1)
+                end = self.line_buffer.rfind(b'\n')
+                if end < 0:
+                    continue
+                lines = self.line_buffer[:end].split(b'\n')
+                del self.line_buffer[:end + 1]
+                for line in lines:
+                    values = line.decode('utf-8').strip().split(',')
                     if len(values) == self.NUM_OF_SENSORS + 1:  # 1 for the timestamp
                         self.data_queue.append(values)
             except Exception as e:
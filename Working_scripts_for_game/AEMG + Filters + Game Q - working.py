@@ -1,18 +1,21 @@
+import multiprocessing
 import queue
-import threading
-import numpy as np
-import serial
-from threading import Thread, Lock
+from threading import Lock, Thread
 import pandas as pd
-from queue import Queue
 import os
+import time
 import logging
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget, QSlider, QSpinBox, QLineEdit
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
-from collections import deque
 from serial.tools import list_ports
+from ring_buffer import RingBuffer
+from latency_monitor import LatencyMonitor
+from shared_ring_buffer import SharedRingBuffer
+from emg_pipeline import (run_pipeline, control_names, decision_trace, DecisionReader, sample_columns, decision_columns,
+                          SAMPLE_BUFFER_SIZE, DECISION_BUFFER_SIZE, DECISION_SENSORS)
+import pygame
 import Breakout_attempt_002 as game
 
 # Constants
@@ -24,165 +27,53 @@ FILTER_DELAY = 25 # Delay for filter (ms)
 FILTER_GAIN = 1.0 # Gain for filter
 FILTER_ALPHA = 0.05 # Alpha for filter
 BAUD_RATE = 115200  # Baud rate for serial communication
+SERIAL_MODE = "csv"  # "csv" or "binary" - must match BINARY_FRAMES in 2_emg_sensor_game.cpp
+STATE_WINDOW_MS = 250  # Sample time each sensor's state is decided over (ms)
+LATENCY_REPORT_INTERVAL = 1.0  # Time between latency percentile updates in the UI (s)
+PIPELINE_STOP_TIMEOUT = 2.0  # Time the pipeline process gets to close the serial port on exit (s)
+GAME_STOP_TIMEOUT = 2.0  # Time the game process gets to close its window on exit before it is terminated (s)
+
+# (name, threshold) of every state per sensor, the first state is the one below every threshold
+SENSOR_STATES = [[("No signal", 0.0), ("Extension", 0.01)],
+                 [("No signal", 0.0), ("Flexion", 0.01)]]
 
 # Sensors dict for UI naming purposes - Update if more sensors are added
 sensor_placement_dict = {1:"Outer forearm sensor value (1)", 2: "Inner forearm sensor value (2)"}
 
-# Controls -> Game
-control_queue = queue.Queue(maxsize=1)
-queue_lock = threading.Lock()
-
 # Set up logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class State:
-    def __init__(self, name: str, threshold: float) -> None:
-        self.name = name
-        self.threshold = threshold
-        self.counter = 0
-
-    def __str__(self) -> str:
-        return self.name
-
-class StateManager:
-    def __init__(self, sensor_num, states, widget) -> None:
-        self.sensor_num = sensor_num
-        self.states = states
-        self.current_state = None
-        self.widget = widget
-
-        self.reset_timer = QtCore.QTimer()
-        self.reset_timer.timeout.connect(self.reset_counters)
-        self.reset_timer.start(500)  # Reset every 0.5 seconds
-
-    def reset_counters(self) -> None:
-        for state in self.states:
-            state.counter = 0
-
-    def update_state(self, value) -> None:
-        for state in sorted(self.states, key=lambda s: s.threshold, reverse=True):
-            if abs(value) > state.threshold:
-                state.counter += 1
-                if self.current_state is None or state.counter > self.current_state.counter:
-                    self.current_state = state
-                break  # Break after the first state whose threshold is crossed
-
-        if self.current_state is not None:
-            self.widget.setText(f"Sensor {self.sensor_num}: {self.current_state.name}")
-
-    def update_threshold(self, state_name: str, new_threshold: float) -> None:
-        for state in self.states:
-            if state.name == state_name:
-                state.threshold = new_threshold
-                print(f"Threshold for {state.name} updated to: {new_threshold}")
-                break
-
-    def get_state_with_highest_count(self) -> tuple:
-        if not self.states:
-            return None  # If there are no states, return None
-
-        # Sort states by counter in descending order and get the first one
-        highest_count_state = sorted(self.states, key=lambda s: s.counter, reverse=True)[0]
-        return (highest_count_state.name, highest_count_state.counter)
-
-class LowPassFilter:
-    def __init__(self, alpha: float) -> None:
-        self.alpha = alpha
-        self.state = 0
-
-    def filter(self, value: float) -> float:
-        self.state = self.alpha * value + (1 - self.alpha) * self.state
-        return self.state
-
-class HighPassFilter:
-    def __init__(self, alpha: float) -> None:
-        self.alpha = alpha
-        self.low_pass_filter = LowPassFilter(alpha)
-        self.prev_raw_value = None
-        self.prev_high_passed_value = 0
-
-    def filter(self, value: float) -> float:
-        if self.prev_raw_value is None:
-            self.prev_raw_value = value
-        high_passed_value = self.alpha * self.prev_high_passed_value + self.alpha * (value - self.prev_raw_value)
-        self.prev_raw_value = value
-        self.prev_high_passed_value = high_passed_value
-        return high_passed_value
-
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.NUM_OF_SENSORS = NUM_OF_SENSORS
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
-                        raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(e, exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
-class CombFilter:
-    def __init__(self, delay: int, gain: float) -> None:
-        self.delay = delay
-        self.gain = gain
-        self.buffer = deque()
-
-    def filter(self, signal: float) -> float:
-        self.buffer.append(signal)
-        if len(self.buffer) < self.delay:
-            return signal
-        else:
-            output = signal - self.gain * self.buffer[-self.delay]
-            self.buffer.popleft()  # remove oldest value
-            return output
-        
 class DataPlotter:
-    def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
-        self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.NUM_OF_SENSORS)]
+    """Plot window, reads samples and decisions from the pipeline process and sends it the settings changed here"""
+    def __init__(self, samples: SharedRingBuffer, decisions: SharedRingBuffer, commands, status, stop_event, pipeline,
+                 plot_window: int = 500) -> None:
+        self.samples = samples
+        self.decisions = decisions
+        self.commands = commands
+        self.status = status
+        self.stop_event = stop_event
+        self.pipeline = pipeline
+        self.sample_position = samples.written()
+        self.decision_position = decisions.written()
+        self.lost_samples = 0  # Samples the pipeline overwrote before the plot read them
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, NUM_OF_SENSORS)
         self.record_data = []
         self.record_lock = Lock()
         self.is_recording = False
         self.is_auto_scaled = True
         self.alpha = FILTER_ALPHA
-        self.comb_filters = [CombFilter(delay=FILTER_DELAY, gain=FILTER_GAIN) for _ in range(reader.NUM_OF_SENSORS)]
-        self.low_pass_filters = [LowPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
-        self.high_pass_filters = [HighPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
+        self.latency_monitor = LatencyMonitor(log_path=None)  # Pipeline stages only, the game process logs the rest
         self.setup_ui()
         self.setup_plot()
-        QApplication.instance().aboutToQuit.connect(self.reader.stop)
+        QApplication.instance().aboutToQuit.connect(self.stop_pipeline)
+        self.last_latency_report = time.perf_counter()
 
-    def update_and_reset_states(self, state: State, value: str) -> None:
-        """Update state threshold and reset counter"""
-        try:
-            value = float(value)
-            state.threshold = value
-            state.counter = 0
-            print(f"Threshold for {state.name} updated to: {value}")
-        except ValueError:
-            print("Invalid value for threshold. Please enter a float.")
+    def stop_pipeline(self) -> None:
+        self.stop_event.set()
+        self.pipeline.join(PIPELINE_STOP_TIMEOUT)
+        if self.lost_samples:
+            logging.error(f"Plot window fell behind and skipped {self.lost_samples} samples")
 
     def setup_ui(self) -> None:
         self.app = QApplication([])
@@ -198,6 +89,9 @@ class DataPlotter:
         self.file_name_edit = QLineEdit()
         self.label = QLabel('Enter file title:')
         self.container.layout().addWidget(self.label)
+
+        self.latency_label = QLabel('Latency: waiting for data')
+        self.container.layout().addWidget(self.latency_label)
         self.container.layout().addWidget(self.file_name_edit)
         self.container.layout().addWidget(self.record_button)
         self.container.layout().addWidget(self.toggle_y_axis_button)
@@ -258,33 +152,19 @@ class DataPlotter:
         self.container.layout().addWidget(QLabel('Sensor 2 threshold:'))
         self.container.layout().addWidget(self.sensor2_threshold_edit)
 
-        self.sensor1_threshold_edit.textChanged.connect(lambda value: self.state_manager1.update_threshold("Extension", float(value)))
-        self.sensor2_threshold_edit.textChanged.connect(lambda value: self.state_manager2.update_threshold("Flexion", float(value)))
-
-        # Initialize StateManager objects
-        self.sensor1_no_signal = State("No signal", 0.0)
-        self.sensor1_extension = State("Extension", 0.01)  # Initialize with 0.0 as threshold
-        self.state_manager1 = StateManager(1, [self.sensor1_no_signal, self.sensor1_extension], QLabel())
-
-        self.sensor2_no_signal = State("No signal", 0.0)
-        self.sensor2_flexion = State("Flexion", 0.01)  # Initialize with 0.0 as threshold
-        self.state_manager2 = StateManager(2, [self.sensor2_no_signal, self.sensor2_flexion], QLabel())
-        
-        self.container.layout().addWidget(self.state_manager1.widget)
-        self.container.layout().addWidget(self.state_manager2.widget)
+        # Thresholds live in the pipeline process's StateManagers
+        self.sensor1_threshold_edit.textChanged.connect(lambda value: self.commands.put(("threshold", 0, "Extension", float(value))))
+        self.sensor2_threshold_edit.textChanged.connect(lambda value: self.commands.put(("threshold", 1, "Flexion", float(value))))
 
-    def setup_timer(self) -> None:
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_and_reset_states)
-        self.timer.start(500)  # Interval in milliseconds (0.5 seconds)
+        # State of each sensor as decided in the pipeline process
+        self.state_labels = [QLabel(f"Sensor {i + 1}: waiting for data") for i in range(NUM_OF_SENSORS)]
+        for state_label in self.state_labels:
+            self.container.layout().addWidget(state_label)
 
     def update_alpha(self, value) -> None:
         self.alpha = value / 100.0
         self.alpha_label.setText(f"Alpha: {self.alpha}")
-        for lp_filter in self.low_pass_filters:
-            lp_filter.alpha = self.alpha
-        for hp_filter in self.high_pass_filters:
-            hp_filter.alpha = self.alpha
+        self.commands.put(("alpha", self.alpha))
 
     def update_y_range(self) -> None:
         if not self.is_auto_scaled:
@@ -304,16 +184,14 @@ class DataPlotter:
     def update_delay(self, value) -> None:
         value = int(value)
         self.delay_label.setText(f"Delay: {value}")
-        for filter in self.comb_filters:
-            filter.delay = value
+        self.commands.put(("delay", value))
 
     def update_gain(self, value) -> None:
         self.gain_label.setText(f"Gain: {value/100}")
-        for filter in self.comb_filters:
-            filter.gain = value / 100
+        self.commands.put(("gain", value / 100))
 
     def setup_plot(self) -> None:
-        self.plot = [self.win.addPlot(title=f"{sensor_placement_dict[i+1]} data") for i in range(self.reader.NUM_OF_SENSORS)]
+        self.plot = [self.win.addPlot(title=f"{sensor_placement_dict[i+1]} data") for i in range(NUM_OF_SENSORS)]
         self.curve = [p.plot(pen='y') for p in self.plot]
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
@@ -340,66 +218,51 @@ class DataPlotter:
         if file_title:
             file_path = os.path.join('output', 'gesture recordings', f'{file_title}.csv')
             with self.record_lock:
-                df = pd.DataFrame(self.record_data, columns=['timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.NUM_OF_SENSORS)])
+                df = pd.DataFrame(self.record_data, columns=['timestamp'] + [sensor_placement_dict[i+1] for i in range(NUM_OF_SENSORS)])
             df.to_csv(file_path, index=False, chunksize=1000)
             self.label.setText(f'Saved recording as {file_title}.csv')
         else:
             self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
         self.record_button.setEnabled(True)
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
-
-    def put_control_value(self) -> None:
-        with queue_lock:
-            while not control_queue.empty():
-                control_queue.get()
-            control_queue.put((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
-
     def update(self) -> None:
-
-        while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
+        # Only drawing happens here, filtering and classification run in the pipeline process
+        try:
+            message = self.status.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            # The pipeline failed, e.g. the serial port could not be opened, and no data will come
+            self.latency_label.setText(message)
+            for i, state_label in enumerate(self.state_labels):
+                state_label.setText(f"Sensor {i + 1}: no data")
+        rows, self.sample_position, lost = self.samples.read_new(self.sample_position)
+        self.lost_samples += lost
+        if len(rows):
             if self.is_recording:
                 with self.record_lock:
-                    self.record_data.append(data)
-            for i, value in enumerate(data[1:]):
-                filtered_value = self.comb_filters[i].filter(value)  # Apply Comb filter
-                filtered_value = self.low_pass_filters[i].filter(filtered_value)  # Apply Low Pass filter
-                filtered_value = self.high_pass_filters[i].filter(filtered_value)  # Apply High Pass filter
-
-                # Update state of the sensor based on filtered value
-                if i == 0:
-                    self.state_manager1.update_state(filtered_value)
-                elif i == 1:
-                    self.state_manager2.update_state(filtered_value)
-
-                self.value_data[i] = self.shift_and_append(self.value_data[i], filtered_value)
-
-                put_control_value((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
-
-                # print(control_queue.qsize())
-
-                
+                    self.record_data.extend(rows[:, :1 + NUM_OF_SENSORS].tolist())  # Timestamp and raw values
+            self.time_data.extend(rows[:, 0])
+            self.value_data.extend(rows[:, 1 + NUM_OF_SENSORS:])
+            for i, curve in enumerate(self.curve):
+                curve.setData(self.time_data.view(), self.value_data.view()[:, i])
+
+        rows, self.decision_position, _ = self.decisions.read_new(self.decision_position)
+        for row in rows:
+            self.latency_monitor.finish(decision_trace(row), end="mailbox")
+        if len(rows):
+            for i, (state_label, states) in enumerate(zip(self.state_labels, SENSOR_STATES)):
+                state = int(rows[-1, DECISION_SENSORS + 2 * i])
+                if state >= 0:
+                    state_label.setText(f"Sensor {i + 1}: {states[state][0]}")
+
+        if time.perf_counter() - self.last_latency_report >= LATENCY_REPORT_INTERVAL:
+            self.last_latency_report = time.perf_counter()
+            self.latency_label.setText("Latency (sample -> stage end)\n" + self.latency_monitor.report())
 
     def start(self) -> None:
         QApplication.instance().exec_()
 
-def put_control_value(value):
-    with queue_lock:
-        while not control_queue.empty():
-            control_queue.get()
-        control_queue.put(value)
-
-def greater_of_two_states(a, b) -> State:
-    if a[1] > b[1]:
-        return a
-    else:
-        return b
-
 def find_com_port(vendor_id=None, product_id=None, device_description=None) -> object:
     com_ports = list_ports.comports()
 
@@ -414,19 +277,54 @@ def find_com_port(vendor_id=None, product_id=None, device_description=None) -> o
 
     raise ValueError("Device not found")
 
-def start_game() -> None:
-    game.run_game(control_queue)
+def quit_game_on(stop_event) -> None:
+    # Ends the game through its own quit event, so it closes its window and the latency log itself
+    stop_event.wait()
+    try:
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+    except pygame.error:
+        pass  # The game already quit
+
+def start_game(decisions: SharedRingBuffer, names: list, stop_event) -> None:
+    # Game process, takes the newest decision every frame and quits when the plot window closes
+    latency_monitor = LatencyMonitor()  # Sample to paddle latency per stage, logged to output/latency
+    Thread(target=quit_game_on, args=(stop_event,), daemon=True).start()
+    try:
+        game.run_game(DecisionReader(decisions, names), latency_monitor)
+    finally:
+        latency_monitor.close()
 
 if __name__ == "__main__":
     try:
         port = find_com_port(device_description='Arduino')
-        reader = SerialReader(port, BAUD_RATE, NUM_OF_SENSORS)
-
-        game_thread = threading.Thread(target=start_game)
-        game_thread.start()
- 
-        plotter = DataPlotter(reader)
-        plotter.start()
-
     except ValueError as e:
-        print(e)
\ No newline at end of file
+        print(e)
+    else:
+        # Acquisition, filtering and classification get their own process, so plot redraws and game frames
+        # never hold up a control decision and each process keeps its own frame rate
+        samples = SharedRingBuffer(SAMPLE_BUFFER_SIZE, sample_columns(NUM_OF_SENSORS))
+        decisions = SharedRingBuffer(DECISION_BUFFER_SIZE, decision_columns(NUM_OF_SENSORS))
+        commands = multiprocessing.Queue()
+        status = multiprocessing.Queue()  # Pipeline failures, shown in the plot window
+        stop_event = multiprocessing.Event()
+        filter_settings = {"alpha": FILTER_ALPHA, "delay": FILTER_DELAY, "gain": FILTER_GAIN}
+        pipeline = multiprocessing.Process(target=run_pipeline, daemon=True,
+                                           args=(port, BAUD_RATE, NUM_OF_SENSORS, SERIAL_MODE, SENSOR_STATES, filter_settings,
+                                                 STATE_WINDOW_MS, samples, decisions, commands, status, stop_event))
+        pipeline.start()
+
+        game_process = multiprocessing.Process(target=start_game, args=(decisions, control_names(SENSOR_STATES), stop_event))
+        game_process.start()
+
+        try:
+            plotter = DataPlotter(samples, decisions, commands, status, stop_event, pipeline)
+            plotter.start()
+        finally:
+            # Closing the plot window ends the program, the game included
+            stop_event.set()
+            game_process.join(GAME_STOP_TIMEOUT)
+            if game_process.is_alive():
+                game_process.terminate()
+                game_process.join()
+            samples.close()
+            decisions.close()
@@ -1,11 +1,8 @@
-import queue
 import threading
-import numpy as np
-import serial
-from threading import Thread, Lock
+from threading import Lock
 import pandas as pd
-from queue import Queue
 import os
+import time
 import logging
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget, QSlider, QSpinBox, QLineEdit
 from PyQt5.QtCore import Qt, QTimer
@@ -13,6 +10,12 @@ import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
 from collections import Counter, deque
 from serial.tools import list_ports
+from serial_communication import SerialReader
+from filtering import FilterBank
+from ring_buffer import RingBuffer
+from state_management import State, StateManager
+from control_mailbox import ControlMailbox
+from latency_monitor import LatencyMonitor
 import Working_scripts_for_game.Breakout_attempt_002 as game
 
 # Constants
@@ -24,155 +27,36 @@ FILTER_DELAY = 25 # Delay for filter (ms)
 FILTER_GAIN = 1.0 # Gain for filter
 FILTER_ALPHA = 0.05 # Alpha for filter
 BAUD_RATE = 115200  # Baud rate for serial communication
+SERIAL_MODE = "csv"  # "csv" or "binary" - must match BINARY_FRAMES in 2_emg_sensor_game.cpp
+STATE_WINDOW_MS = 250  # Sample time each sensor's state is decided over (ms)
+LATENCY_REPORT_INTERVAL = 1.0  # Time between latency percentile updates in the UI (s)
 
 # Sensors dict for UI naming purposes - Update if more sensors are added
 sensor_placement_dict = {1:"Outer forearm sensor value (1)", 2: "Inner forearm sensor value (2)"}
 
 # Controls -> Game
-control_queue = queue.Queue(maxsize=1)
-queue_lock = threading.Lock()
+control_mailbox = ControlMailbox()  # Latest control value for the game
 
 # Set up logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class State:
-    def __init__(self, name: str, threshold: float) -> None:
-        self.name = name
-        self.threshold = threshold
-        self.counter = 0
-
-    def __str__(self) -> str:
-        return self.name
-
-class StateManager:
-    def __init__(self, sensor_num, states, widget) -> None:
-        self.sensor_num = sensor_num
-        self.states = states
-        self.current_state = None
-        self.widget = widget
-
-        self.reset_timer = QtCore.QTimer()
-        self.reset_timer.timeout.connect(self.reset_counters)
-        self.reset_timer.start(500)  # Reset every 0.5 seconds
-
-    def reset_counters(self) -> None:
-        for state in self.states:
-            state.counter = 0
-
-    def update_state(self, value) -> None:
-        for state in sorted(self.states, key=lambda s: s.threshold, reverse=True):
-            if abs(value) > state.threshold:
-                state.counter += 1
-                if self.current_state is None or state.counter > self.current_state.counter:
-                    self.current_state = state
-                break  # Break after the first state whose threshold is crossed
-
-        if self.current_state is not None:
-            self.widget.setText(f"Sensor {self.sensor_num}: {self.current_state.name}")
-
-    def update_threshold(self, state_name: str, new_threshold: float) -> None:
-        for state in self.states:
-            if state.name == state_name:
-                state.threshold = new_threshold
-                print(f"Threshold for {state.name} updated to: {new_threshold}")
-                break
-
-    def get_state_with_highest_count(self) -> tuple:
-        if not self.states:
-            return None  # If there are no states, return None
-
-        # Sort states by counter in descending order and get the first one
-        highest_count_state = sorted(self.states, key=lambda s: s.counter, reverse=True)[0]
-        return (highest_count_state.name, highest_count_state.counter)
-
-class LowPassFilter:
-    def __init__(self, alpha: float) -> None:
-        self.alpha = alpha
-        self.state = 0
-
-    def filter(self, value: float) -> float:
-        self.state = self.alpha * value + (1 - self.alpha) * self.state
-        return self.state
-
-class HighPassFilter:
-    def __init__(self, alpha: float) -> None:
-        self.alpha = alpha
-        self.low_pass_filter = LowPassFilter(alpha)
-        self.prev_raw_value = None
-        self.prev_high_passed_value = 0
-
-    def filter(self, value: float) -> float:
-        if self.prev_raw_value is None:
-            self.prev_raw_value = value
-        high_passed_value = self.alpha * self.prev_high_passed_value + self.alpha * (value - self.prev_raw_value)
-        self.prev_raw_value = value
-        self.prev_high_passed_value = high_passed_value
-        return high_passed_value
-
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.NUM_OF_SENSORS = NUM_OF_SENSORS
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
-                        raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(e, exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
-class CombFilter:
-    def __init__(self, delay: int, gain: float) -> None:
-        self.delay = delay
-        self.gain = gain
-        self.buffer = deque()
-
-    def filter(self, signal: float) -> float:
-        self.buffer.append(signal)
-        if len(self.buffer) < self.delay:
-            return signal
-        else:
-            output = signal - self.gain * self.buffer[-self.delay]
-            self.buffer.popleft()  # remove oldest value
-            return output
-        
 class DataPlotter:
-    def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
+    def __init__(self, reader: SerialReader, latency_monitor: LatencyMonitor, plot_window: int = 500) -> None:
         self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.NUM_OF_SENSORS)]
+        self.latency_monitor = latency_monitor
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, reader.NUM_OF_SENSORS)
         self.record_data = []
         self.record_lock = Lock()
         self.is_recording = False
         self.is_auto_scaled = True
         self.alpha = FILTER_ALPHA
-        self.comb_filters = [CombFilter(delay=FILTER_DELAY, gain=FILTER_GAIN) for _ in range(reader.NUM_OF_SENSORS)]
-        self.low_pass_filters = [LowPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
-        self.high_pass_filters = [HighPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
+        self.filter_bank = FilterBank(reader.NUM_OF_SENSORS, alpha=self.alpha, delay=FILTER_DELAY, gain=FILTER_GAIN)
         self.setup_ui()
         self.setup_plot()
         QApplication.instance().aboutToQuit.connect(self.reader.stop)
+        QApplication.instance().aboutToQuit.connect(self.latency_monitor.close)
+        self.last_latency_report = time.perf_counter()
         self.recent_values = deque(maxlen=5)
         self.recent_counter = Counter()
 
@@ -200,6 +84,9 @@ class DataPlotter:
         self.file_name_edit = QLineEdit()
         self.label = QLabel('Enter file title:')
         self.container.layout().addWidget(self.label)
+
+        self.latency_label = QLabel('Latency: waiting for data')
+        self.container.layout().addWidget(self.latency_label)
         self.container.layout().addWidget(self.file_name_edit)
         self.container.layout().addWidget(self.record_button)
         self.container.layout().addWidget(self.toggle_y_axis_button)
@@ -266,11 +153,11 @@ class DataPlotter:
         # Initialize StateManager objects
         self.sensor1_no_signal = State("No signal", 0.0)
         self.sensor1_extension = State("Extension", 0.01)  # Initialize with 0.0 as threshold
-        self.state_manager1 = StateManager(1, [self.sensor1_no_signal, self.sensor1_extension], QLabel())
+        self.state_manager1 = StateManager(1, [self.sensor1_no_signal, self.sensor1_extension], QLabel(), window_ms=STATE_WINDOW_MS)
 
         self.sensor2_no_signal = State("No signal", 0.0)
         self.sensor2_flexion = State("Flexion", 0.01)  # Initialize with 0.0 as threshold
-        self.state_manager2 = StateManager(2, [self.sensor2_no_signal, self.sensor2_flexion], QLabel())
+        self.state_manager2 = StateManager(2, [self.sensor2_no_signal, self.sensor2_flexion], QLabel(), window_ms=STATE_WINDOW_MS)
         
         self.container.layout().addWidget(self.state_manager1.widget)
         self.container.layout().addWidget(self.state_manager2.widget)
@@ -283,10 +170,7 @@ class DataPlotter:
     def update_alpha(self, value) -> None:
         self.alpha = value / 100.0
         self.alpha_label.setText(f"Alpha: {self.alpha}")
-        for lp_filter in self.low_pass_filters:
-            lp_filter.alpha = self.alpha
-        for hp_filter in self.high_pass_filters:
-            hp_filter.alpha = self.alpha
+        self.filter_bank.alpha = self.alpha
 
     def update_y_range(self) -> None:
         if not self.is_auto_scaled:
@@ -306,13 +190,11 @@ class DataPlotter:
     def update_delay(self, value) -> None:
         value = int(value)
         self.delay_label.setText(f"Delay: {value}")
-        for filter in self.comb_filters:
-            filter.delay = value
+        self.filter_bank.delay = value
 
     def update_gain(self, value) -> None:
         self.gain_label.setText(f"Gain: {value/100}")
-        for filter in self.comb_filters:
-            filter.gain = value / 100
+        self.filter_bank.gain = value / 100
 
     def setup_plot(self) -> None:
         self.plot = [self.win.addPlot(title=f"{sensor_placement_dict[i+1]} data") for i in range(self.reader.NUM_OF_SENSORS)]
@@ -349,57 +231,42 @@ class DataPlotter:
             self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
         self.record_button.setEnabled(True)
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
-
     def put_control_value(self) -> None:
-        with queue_lock:
-            while not control_queue.empty():
-                control_queue.get()
-            control_queue.put((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
+        put_control_value((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
 
     def update(self) -> None:
 
         most_common_value = "" # !!!!!!!!
 
         while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
+            block = self.reader.data_queue.get()
+            trace = self.latency_monitor.trace(block[-1, 0]) if len(block) else None
             if self.is_recording:
                 with self.record_lock:
-                    self.record_data.append(data)
-            for i, value in enumerate(data[1:]):
-                filtered_value = self.comb_filters[i].filter(value)  # Apply Comb filter
-                filtered_value = self.low_pass_filters[i].filter(filtered_value)  # Apply Low Pass filter
-                filtered_value = self.high_pass_filters[i].filter(filtered_value)  # Apply High Pass filter
-
-                # Update state of the sensor based on filtered value
-                if i == 0:
-                    self.state_manager1.update_state(filtered_value)
-                elif i == 1:
-                    self.state_manager2.update_state(filtered_value)
-
-                self.value_data[i] = self.shift_and_append(self.value_data[i], filtered_value)
-
-                self.recent_values.append((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
-                if len(self.recent_values) == 5:
-                    old_value = self.recent_values.popleft()
-                    self.recent_counter[old_value] -= 1
-                    if self.recent_counter[old_value] == 0:
-                        del self.recent_counter[old_value]
-                self.recent_counter[filtered_value] += 1
-
-                if len(self.recent_values) == 5:
-                    most_common_value = self.recent_counter.most_common(1)[0][0]
-                put_control_value(most_common_value)
-
-                # put_control_value((greater_of_two_states(self.state_manager1.get_state_with_highest_count(), self.state_manager2.get_state_with_highest_count()))[0])
-                print(most_common_value)
-                print(self.recent_values.most_common(1)[0][0])
-                print(self.recent_values)
-                print(control_queue.qsize())
+                    self.record_data.extend(block.tolist())
+            filtered_block = self.filter_bank.filter(block[:, 1:])  # Apply Comb, Low Pass and High Pass filters
+            self.latency_monitor.stamp(trace, "filter")
+            self.time_data.extend(block[:, 0])
+            self.value_data.extend(filtered_block)
+            # Update the state of each sensor from the whole filtered block at once
+            self.state_manager1.update_block(filtered_block[:, 0], block[:, 0])
+            self.state_manager2.update_block(filtered_block[:, 1], block[:, 0])
+            self.latency_monitor.stamp(trace, "classify")
+            if len(filtered_block) == 0:
+                continue
+
+            # Vote over the game value each of the last samples would have produced
+            last = self.recent_values.maxlen
+            for highest1, highest2 in zip(self.state_manager1.highest_counts(last), self.state_manager2.highest_counts(last)):
+                self.recent_values.append(greater_of_two_states(highest1, highest2)[0])
+            self.recent_counter = Counter(self.recent_values)
+            if len(self.recent_values) == last:
+                most_common_value = self.recent_counter.most_common(1)[0][0]
+            put_control_value(most_common_value, trace)
+
+        if time.perf_counter() - self.last_latency_report >= LATENCY_REPORT_INTERVAL:
+            self.last_latency_report = time.perf_counter()
+            self.latency_label.setText("Latency (sample -> stage end)\n" + self.latency_monitor.report())
 
 
                 
@@ -407,11 +274,10 @@ class DataPlotter:
     def start(self) -> None:
         QApplication.instance().exec_()
 
-def put_control_value(value):
-    with queue_lock:
-        while not control_queue.empty():
-            control_queue.get()
-        control_queue.put(value)
+def put_control_value(value, trace=None):
+    # Overwrites the value the game has not read yet, the game only ever wants the newest one
+    LatencyMonitor.stamp(trace, "mailbox")
+    control_mailbox.put(value, trace=trace)
 
 def greater_of_two_states(a, b) -> State:
     if a[1] > b[1]:
@@ -433,18 +299,19 @@ def find_com_port(vendor_id=None, product_id=None, device_description=None) -> o
 
     raise ValueError("Device not found")
 
-def start_game() -> None:
-    game.run_game(control_queue)
+def start_game(latency_monitor: LatencyMonitor) -> None:
+    game.run_game(control_mailbox, latency_monitor)
 
 if __name__ == "__main__":
     try:
         port = find_com_port(device_description='Arduino')
-        reader = SerialReader(port, BAUD_RATE, NUM_OF_SENSORS)
+        latency_monitor = LatencyMonitor()  # Sample to paddle latency per stage, logged to output/latency
+        reader = SerialReader(port, BAUD_RATE, NUM_OF_SENSORS, mode=SERIAL_MODE, monitor=latency_monitor)
 
-        game_thread = threading.Thread(target=start_game)
+        game_thread = threading.Thread(target=start_game, args=(latency_monitor,))
         game_thread.start()
  
-        plotter = DataPlotter(reader)
+        plotter = DataPlotter(reader, latency_monitor)
         plotter.start()
 
     except ValueError as e:
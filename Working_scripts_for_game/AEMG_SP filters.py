@@ -1,16 +1,15 @@
-import numpy as np
-import serial
-from threading import Thread, Lock
+from threading import Lock
 import pandas as pd
-from queue import Queue
 import os
 import logging
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget, QSlider, QSpinBox
 from PyQt5.QtCore import Qt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
-from collections import deque
 from serial.tools import list_ports
+from serial_communication import SerialReader
+from filtering import FilterBank
+from ring_buffer import RingBuffer
 
 # ! Good values for alpha:0.5, Delay: 13/25/37 (roughly), Gain: 1.0
 
@@ -18,97 +17,24 @@ NUM_OF_SENSORS = 2  # ! Number of sensors - check main.cpp for number expected
 BUFFER_SIZE = 1024  # Buffer size for serial port reading
 RECORD_DELAY = 3000  # Delay before recording starts (ms)
 RECORD_DURATION = 5000  # Duration of recording (ms)
+SERIAL_MODE = "csv"  # "csv" or "binary" - must match BINARY_FRAMES in 2_emg_sensor_game.cpp
 
 sensor_placement_dict = {1:"Outer forearm sensor value (1)", 2: "Inner forearm sensor value (2)"} # ! Update if more sensors are added
 
 # Set up logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class LowPassFilter:
-    def __init__(self, alpha: float):
-        self.alpha = alpha
-        self.state = 0
-
-    def filter(self, value: float) -> float:
-        self.state = self.alpha * value + (1 - self.alpha) * self.state
-        return self.state
-
-class HighPassFilter:
-    def __init__(self, alpha: float):
-        self.alpha = alpha
-        self.low_pass_filter = LowPassFilter(alpha)
-        self.prev_raw_value = None
-        self.prev_high_passed_value = 0
-
-    def filter(self, value: float) -> float:
-        if self.prev_raw_value is None:
-            self.prev_raw_value = value
-        high_passed_value = self.alpha * self.prev_high_passed_value + self.alpha * (value - self.prev_raw_value)
-        self.prev_raw_value = value
-        self.prev_high_passed_value = high_passed_value
-        return high_passed_value
-
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.NUM_OF_SENSORS = NUM_OF_SENSORS
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
-                        raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(e, exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
-class CombFilter:
-    def __init__(self, delay: int, gain: float) -> None:
-        self.delay = delay
-        self.gain = gain
-        self.buffer = deque()
-
-    def filter(self, signal: float) -> float:
-        self.buffer.append(signal)
-        if len(self.buffer) < self.delay:
-            return signal
-        else:
-            output = signal - self.gain * self.buffer[-self.delay]
-            self.buffer.popleft()  # remove oldest value
-            return output
-        
 class DataPlotter:
     def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
         self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.NUM_OF_SENSORS)]
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, reader.NUM_OF_SENSORS)
         self.record_data = []
         self.record_lock = Lock()
         self.is_recording = False
         self.is_auto_scaled = True
         self.alpha = 0.1
-        self.comb_filters = [CombFilter(delay=0, gain=0) for _ in range(reader.NUM_OF_SENSORS)]
-        self.low_pass_filters = [LowPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
-        self.high_pass_filters = [HighPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
+        self.filter_bank = FilterBank(reader.NUM_OF_SENSORS, alpha=self.alpha, delay=0, gain=0)
         self.setup_ui()
         self.setup_plot()
         QApplication.instance().aboutToQuit.connect(self.reader.stop)
@@ -184,10 +110,7 @@ class DataPlotter:
     def update_alpha(self, value):
         self.alpha = value / 100.0
         self.alpha_label.setText(f"Alpha: {self.alpha}")
-        for lp_filter in self.low_pass_filters:
-            lp_filter.alpha = self.alpha
-        for hp_filter in self.high_pass_filters:
-            hp_filter.alpha = self.alpha
+        self.filter_bank.alpha = self.alpha
 
     def update_y_range(self) -> None:
         if not self.is_auto_scaled:
@@ -207,13 +130,11 @@ class DataPlotter:
     def update_delay(self, value):
         value = int(value)
         self.delay_label.setText(f"Delay: {value}")
-        for filter in self.comb_filters:
-            filter.delay = value
+        self.filter_bank.delay = value
 
     def update_gain(self, value):
         self.gain_label.setText(f"Gain: {value/100}")
-        for filter in self.comb_filters:
-            filter.gain = value / 100
+        self.filter_bank.gain = value / 100
 
     def setup_plot(self) -> None:
         self.plot = [self.win.addPlot(title=f"{sensor_placement_dict[i+1]} data") for i in range(self.reader.NUM_OF_SENSORS)]
@@ -250,24 +171,17 @@ class DataPlotter:
             self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
         self.record_button.setEnabled(True)
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
-
     def update(self) -> None:
         while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
+            block = self.reader.data_queue.get()
             if self.is_recording:
                 with self.record_lock:
-                    self.record_data.append(data)
-            for i, value in enumerate(data[1:]):
-                filtered_value = self.comb_filters[i].filter(value)  # Apply Comb filter
-                filtered_value = self.low_pass_filters[i].filter(filtered_value)  # Apply Low Pass filter
-                filtered_value = self.high_pass_filters[i].filter(filtered_value)  # Apply High Pass filter
-                self.value_data[i] = self.shift_and_append(self.value_data[i], filtered_value)
-                self.curve[i].setData(self.time_data, self.value_data[i])
+                    self.record_data.extend(block.tolist())
+            filtered_block = self.filter_bank.filter(block[:, 1:])  # Apply Comb, Low Pass and High Pass filters
+            self.time_data.extend(block[:, 0])
+            self.value_data.extend(filtered_block)
+        for i, curve in enumerate(self.curve):
+            curve.setData(self.time_data.view(), self.value_data.view()[:, i])
 
     def start(self) -> None:
         QApplication.instance().exec_()
@@ -289,7 +203,7 @@ def find_com_port(vendor_id=None, product_id=None, device_description=None):
 if __name__ == "__main__":
     try:
         port = find_com_port(device_description='Arduino')
-        reader = SerialReader(port, 115200, NUM_OF_SENSORS)
+        reader = SerialReader(port, 115200, NUM_OF_SENSORS, mode=SERIAL_MODE)
         plotter = DataPlotter(reader)
         plotter.start()
     except ValueError as e:
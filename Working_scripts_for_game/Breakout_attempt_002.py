@@ -1,8 +1,7 @@
 import pygame
 import sys
-import queue
 
-def run_game(control_queue):
+def run_game(control_mailbox, latency_monitor=None):
 # def run_game(plotter):
 
     # General setup
@@ -37,21 +36,19 @@ def run_game(control_queue):
 
 
             # Paddle movement
-        try:
-            control = control_queue.get_nowait()
-            # control = plotter.get()
+        control = control_mailbox.take()  # None when no new value arrived since the last frame
+        # control = plotter.get()
+        if control is not None:
             print("in-game control = ", control)
-
-            if control == "Flexion" and paddle.left > 0:
-                print("left")   
-                # control_queue.clear()
-                paddle.move_ip(-paddle_speed, 0)
-            elif control == "Extension" and paddle.right < screen_width:
-                print("right")
-                # control_queue.clear()
-                paddle.move_ip(paddle_speed, 0)
-        except queue.Empty:
-            pass
+            if latency_monitor is not None:
+                latency_monitor.finish(control_mailbox.taken[3])
+
+        if control == "Flexion" and paddle.left > 0:
+            print("left")   
+            paddle.move_ip(-paddle_speed, 0)
+        elif control == "Extension" and paddle.right < screen_width:
+            print("right")
+            paddle.move_ip(paddle_speed, 0)
         
 
         # Ball movement
@@ -89,5 +86,6 @@ def run_game(control_queue):
         pygame.display.flip()
         clock.tick(60)
 
+    print(f"Control values overwritten before the game read them: {control_mailbox.dropped}")
     pygame.quit()
     sys.exit()
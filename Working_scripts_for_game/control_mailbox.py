@@ -0,0 +1,33 @@
+import time
+
+class ControlMailbox:
+    """Latest control value from the EMG pipeline for the game, one slot that every put overwrites
+
+    The slot is a (sequence, value, timestamp, trace) tuple replaced by a single attribute assignment, which the GIL makes
+    atomic, so there is no queue and no lock. Only one thread may put and one thread may take.
+    """
+    def __init__(self) -> None:
+        self.slot = (0, None, 0.0, None)  # Sequence 0 is "nothing put yet"
+        self.taken = self.slot  # Slot the last take() returned the value of
+        self.read_sequence = 0  # Last sequence the reader took, only the reader writes it
+        self.dropped = 0  # Values overwritten before the reader took them
+
+    def put(self, value, timestamp: float = None, trace=None) -> None:
+        # timestamp is when the value was decided, time.perf_counter() by default. trace rides along for the LatencyMonitor
+        sequence = self.slot[0] + 1
+        self.slot = (sequence, value, time.perf_counter() if timestamp is None else timestamp, trace)
+
+    def latest(self) -> tuple:
+        """The newest (sequence, value, timestamp, trace), read or not"""
+        return self.slot
+
+    def take(self):
+        """The newest value if it has not been taken yet, otherwise None"""
+        slot = self.slot
+        sequence, value = slot[:2]
+        if sequence == self.read_sequence:
+            return None
+        self.dropped += sequence - self.read_sequence - 1
+        self.read_sequence = sequence
+        self.taken = slot
+        return value
@@ -0,0 +1,132 @@
+import logging
+import queue
+import numpy as np
+from serial_communication import SerialReader
+from filtering import FilterBank
+from state_management import State, StateManager
+from latency_monitor import LatencyMonitor
+from shared_ring_buffer import SharedRingBuffer
+
+SAMPLE_BUFFER_SIZE = 8192  # Samples kept for the plot window, about 8 s at the Arduino's ~1 kHz
+DECISION_BUFFER_SIZE = 1024  # Control decisions kept, one per block
+QUEUE_TIMEOUT = 0.1  # Longest the pipeline waits for a block before it re-checks the stop event (s)
+
+# Decision row layout: micros of the newest sample, control value index, latency trace, then (state, count) per sensor
+DECISION_TRACE = ["sample", "serial", "queue", "filter", "classify", "mailbox"]
+DECISION_SENSORS = 2 + len(DECISION_TRACE)  # First column of the per sensor states
+
+def sample_columns(num_sensors: int) -> int:
+    # Timestamp, raw values, filtered values
+    return 1 + 2 * num_sensors
+
+def decision_columns(num_sensors: int) -> int:
+    return DECISION_SENSORS + 2 * num_sensors
+
+def control_names(sensor_states: list) -> list:
+    """Every state name once, in order, the control value index in a decision row points into this"""
+    names = []
+    for states in sensor_states:
+        for name, _ in states:
+            if name not in names:
+                names.append(name)
+    return names
+
+def strongest_state(states: list) -> tuple:
+    # (name, count) with the highest count, the later sensor wins ties like greater_of_two_states
+    strongest = states[0]
+    for state in states[1:]:
+        if not strongest[1] > state[1]:
+            strongest = state
+    return strongest
+
+def apply_command(command: tuple, filter_bank: FilterBank, state_managers: list) -> None:
+    # Settings changed in the plot window, ("alpha" | "delay" | "gain", value) or ("threshold", sensor, state, value)
+    if command[0] == "threshold":
+        _, sensor, state_name, value = command
+        state_managers[sensor].update_threshold(state_name, value)
+    elif command[0] in ("alpha", "delay", "gain"):
+        setattr(filter_bank, command[0], command[1])
+    else:
+        logging.error(f"Unknown pipeline command: {command}")
+
+def run_pipeline(port: str, baud_rate: int, num_sensors: int, mode: str, sensor_states: list, filter_settings: dict,
+                 state_window_ms: float, samples: SharedRingBuffer, decisions: SharedRingBuffer, commands, status,
+                 stop_event) -> None:
+    """Acquisition, filtering and classification, run as its own process
+
+    Every block goes to `samples` as rows of timestamp, raw and filtered values, and its control decision to
+    `decisions`. Settings arrive as tuples on the `commands` queue. Runs until stop_event is set, or until it fails,
+    then the error message goes on the `status` queue and stop_event is set so the game quits as well.
+    """
+    names = control_names(sensor_states)
+    monitor = LatencyMonitor(log_path=None)  # Only stamps the traces, the game process records them
+    reader = None
+    try:
+        reader = SerialReader(port, baud_rate, num_sensors, mode=mode, monitor=monitor)
+        filter_bank = FilterBank(num_sensors, **filter_settings)
+        state_managers = [StateManager(i + 1, [State(name, threshold) for name, threshold in states], window_ms=state_window_ms)
+                          for i, states in enumerate(sensor_states)]
+        decision = np.full(decision_columns(num_sensors), np.nan)
+        while not stop_event.is_set():
+            while True:
+                try:
+                    apply_command(commands.get_nowait(), filter_bank, state_managers)
+                except queue.Empty:
+                    break
+            try:
+                block = reader.data_queue.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+            trace = monitor.trace(block[-1, 0])
+            filtered_block = filter_bank.filter(block[:, 1:])  # Apply Comb, Low Pass and High Pass filters
+            monitor.stamp(trace, "filter")
+            samples.extend(np.column_stack((block, filtered_block)))
+            # Update the state of each sensor from the whole filtered block at once
+            for i, state_manager in enumerate(state_managers):
+                state_manager.update_block(filtered_block[:, i], block[:, 0])
+            monitor.stamp(trace, "classify")
+
+            highest = [state_manager.get_state_with_highest_count() for state_manager in state_managers]
+            decision[0] = block[-1, 0]
+            decision[1] = names.index(strongest_state(highest)[0])
+            for i, (state_manager, (name, count)) in enumerate(zip(state_managers, highest)):
+                decision[DECISION_SENSORS + 2 * i] = state_manager.states.index(state_manager.current_state) if state_manager.current_state else -1
+                decision[DECISION_SENSORS + 2 * i + 1] = count
+            monitor.stamp(trace, "mailbox")
+            decision[2:DECISION_SENSORS] = [trace[stage] for stage in DECISION_TRACE] if trace else np.nan
+            decisions.append(decision)
+    except Exception as e:
+        logging.error("EMG pipeline stopped", exc_info=True)
+        status.put(f"EMG pipeline stopped: {e}")
+        stop_event.set()  # No data will come, the game quits as well
+    finally:
+        if reader is not None:
+            reader.stop()
+
+def decision_trace(row: np.ndarray):
+    # Latency trace dict of a decision row, None when the block was not traced
+    if np.isnan(row[2]):
+        return None
+    trace = dict(zip(DECISION_TRACE, row[2:DECISION_SENSORS].tolist()))
+    trace["micros"] = row[0]
+    return trace
+
+class DecisionReader:
+    """Newest control value in a decisions buffer, with the take() / taken / dropped interface of ControlMailbox"""
+    def __init__(self, decisions: SharedRingBuffer, names: list) -> None:
+        self.decisions = decisions
+        self.names = names
+        self.taken = (0, None, 0.0, None)
+        self.read_sequence = decisions.written()  # Decisions from before the game started are not for it
+        self.dropped = 0
+
+    def take(self):
+        latest = self.decisions.latest()
+        if latest is None or latest[0] == self.read_sequence:
+            return None
+        sequence, row = latest
+        self.dropped += sequence - self.read_sequence - 1
+        self.read_sequence = sequence
+        value = self.names[int(row[1])]
+        self.taken = (sequence, value, row[2 + DECISION_TRACE.index("mailbox")], decision_trace(row))
+        return value
@@ -0,0 +1,98 @@
+import numpy as np
+from scipy.signal import lfilter
+from collections import deque
+
+# Per-sample reference filters, FilterBank reproduces the CombFilter -> LowPassFilter -> HighPassFilter chain
+class LowPassFilter:
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.state = 0
+
+    def filter(self, value: float) -> float:
+        self.state = self.alpha * value + (1 - self.alpha) * self.state
+        return self.state
+
+class HighPassFilter:
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.low_pass_filter = LowPassFilter(alpha)
+        self.prev_raw_value = None
+        self.prev_high_passed_value = 0
+
+    def filter(self, value: float) -> float:
+        if self.prev_raw_value is None:
+            self.prev_raw_value = value
+        high_passed_value = self.alpha * self.prev_high_passed_value + self.alpha * (value - self.prev_raw_value)
+        self.prev_raw_value = value
+        self.prev_high_passed_value = high_passed_value
+        return high_passed_value
+
+class CombFilter:
+    def __init__(self, delay: int, gain: float) -> None:
+        self.delay = delay
+        self.gain = gain
+        self.buffer = deque()
+
+    def filter(self, signal: float) -> float:
+        self.buffer.append(signal)
+        if len(self.buffer) < self.delay:
+            return signal
+        else:
+            output = signal - self.gain * self.buffer[-self.delay]
+            self.buffer.popleft()  # remove oldest value
+            return output
+
+class FilterBank:
+    """Comb, low pass and high pass filters applied to an (n, num_channels) block at once"""
+    def __init__(self, num_channels: int, alpha: float, delay: int, gain: float) -> None:
+        self.num_channels = num_channels
+        self.alpha = alpha
+        self.delay = delay
+        self.gain = gain
+        self.comb_buffer = np.empty((0, num_channels))  # Same contents as CombFilter.buffer
+        self.low_pass_state = np.zeros(num_channels)
+        self.prev_raw_value = None
+        self.prev_high_passed_value = np.zeros(num_channels)
+
+    def filter(self, block: np.ndarray) -> np.ndarray:
+        if len(block) == 0:
+            return np.empty((0, self.num_channels))
+        filtered = self.comb(np.asarray(block, dtype=float))
+        filtered = self.low_pass(filtered)
+        return self.high_pass(filtered)
+
+    def comb(self, block: np.ndarray) -> np.ndarray:
+        # Mirrors the deque in CombFilter: it grows until it holds `delay` samples, then every sample
+        # is compared with buffer[-delay] and the oldest value is dropped
+        history = len(self.comb_buffer)
+        n = len(block)
+        extended = np.concatenate((self.comb_buffer, block))
+        output = block.copy()
+        if self.delay == 0:
+            # buffer[-0] is the oldest value in the buffer
+            output -= self.gain * extended[:n]
+            keep = history
+        else:
+            start = min(n, max(0, self.delay - 1 - history))  # Samples passed through while the buffer fills
+            output[start:] -= self.gain * extended[history + start + 1 - self.delay:history + n + 1 - self.delay]
+            keep = history + start
+        self.comb_buffer = extended[len(extended) - keep:]
+        return output
+
+    def low_pass(self, block: np.ndarray) -> np.ndarray:
+        # state = alpha * value + (1 - alpha) * state
+        zi = ((1 - self.alpha) * self.low_pass_state)[np.newaxis, :]
+        output, _ = lfilter([self.alpha], [1, self.alpha - 1], block, axis=0, zi=zi)
+        self.low_pass_state = output[-1]
+        return output
+
+    def high_pass(self, block: np.ndarray) -> np.ndarray:
+        # high_passed = alpha * prev_high_passed + alpha * (value - prev_raw)
+        if self.prev_raw_value is None:
+            self.prev_raw_value = block[0]
+        differences = np.diff(block, axis=0, prepend=self.prev_raw_value[np.newaxis, :])
+        zi = (self.alpha * self.prev_high_passed_value)[np.newaxis, :]
+        output, _ = lfilter([self.alpha], [1, -self.alpha], differences, axis=0, zi=zi)
+        self.prev_raw_value = block[-1]
+        self.prev_high_passed_value = output[-1]
+        return output
@@ -0,0 +1,28 @@
+import time
+
+class FrameTimer:
+    """Average drain and draw time per plot frame, for the frame time readout"""
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.frames = 0
+        self.samples = 0
+        self.drain_time = 0.0
+        self.draw_time = 0.0
+        self.max_frame_time = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, drain_time: float, draw_time: float, samples: int) -> None:
+        self.frames += 1
+        self.samples += samples
+        self.drain_time += drain_time
+        self.draw_time += draw_time
+        self.max_frame_time = max(self.max_frame_time, drain_time + draw_time)
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        frames = max(self.frames, 1)
+        return (f"{self.frames / elapsed:.1f} fps | drain {1000 * self.drain_time / frames:.2f} ms | "
+                f"draw {1000 * self.draw_time / frames:.2f} ms | worst frame {1000 * self.max_frame_time:.2f} ms | "
+                f"{self.samples / frames:.0f} samples/frame")
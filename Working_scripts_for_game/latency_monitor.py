@@ -0,0 +1,124 @@
+import csv
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+from ring_buffer import RingBuffer
+
+# Stages a block goes through, each stage's latency is measured from the end of the stage before it
+STAGES = ["serial", "queue", "filter", "classify", "mailbox", "game"]
+LATENCY_LOG = os.path.join("output", "latency", "latency_log.csv")
+LATENCY_HISTORY = 2000  # Latest traces the live percentiles are taken over
+OFFSET_WINDOW = 10.0  # Seconds of blocks the Arduino to host clock offset is estimated over
+MICROS_WRAP = 2 ** 32  # Arduino micros() rolls over after about 71 minutes
+
+class LatencyMonitor:
+    """Per-stage latency of the newest sample of every block, from Arduino micros() to the game frame that reads it
+
+    micros() is mapped to time.perf_counter() with the smallest receive - micros difference seen over the last
+    OFFSET_WINDOW seconds, so the "serial" stage is the delay on top of the fastest transfer in that window, not the
+    absolute time on the wire. Every stage runs on a different thread: the serial reader calls received(), the GUI
+    thread trace() and stamp(), the game thread finish(). Each trace is only written by one thread at a time.
+    """
+    def __init__(self, log_path: str = LATENCY_LOG, history: int = LATENCY_HISTORY) -> None:
+        self.traces = {}  # Block key -> trace, from the serial thread until the GUI thread picks it up
+        self.latencies = {stage: RingBuffer(history) for stage in STAGES + ["total"]}
+        self.counts = {stage: 0 for stage in STAGES + ["total"]}
+        self.offsets = deque()  # (receive time, receive time - micros) of recent blocks, for the clock offset
+        self.last_micros = None
+        self.wrap_offset = 0.0
+        self.lock = threading.Lock()  # Only guards the log file, the hot path never waits on it
+        self.log_path = log_path
+        self.log_file = None
+        self.writer = None
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            self.log_file = open(log_path, "w", newline="")
+            self.writer = csv.writer(self.log_file)
+            self.writer.writerow(["micros"] + [stage + "_ms" for stage in STAGES] + ["total_ms"])
+
+    def sample_time(self, micros: float, received: float) -> float:
+        # Host time the sample was taken at, from the running minimum of receive time - sample time
+        if self.last_micros is not None and micros < self.last_micros:
+            self.wrap_offset += MICROS_WRAP
+        self.last_micros = micros
+        offset = received - (micros + self.wrap_offset) * 1e-6
+        while self.offsets and self.offsets[0][0] < received - OFFSET_WINDOW:
+            self.offsets.popleft()
+        # Only keep offsets that could still be the minimum
+        while self.offsets and self.offsets[-1][1] >= offset:
+            self.offsets.pop()
+        self.offsets.append((received, offset))
+        return (micros + self.wrap_offset) * 1e-6 + self.offsets[0][1]
+
+    def received(self, micros: float, received: float) -> None:
+        """Start the trace of a block, micros is its newest sample and received when that sample was read"""
+        self.traces[micros] = {"micros": micros, "sample": self.sample_time(micros, received), "serial": received}
+
+    def trace(self, micros: float):
+        """Take the trace of the block whose newest sample is micros and stamp its "queue" stage, None if untraced"""
+        trace = self.traces.pop(micros, None)
+        if trace is not None:
+            trace["queue"] = time.perf_counter()
+        # Blocks the consumer skipped never get picked up, drop them instead of growing forever
+        if len(self.traces) > LATENCY_HISTORY:
+            self.traces.clear()
+        return trace
+
+    @staticmethod
+    def stamp(trace, stage: str) -> None:
+        if trace is not None:
+            trace[stage] = time.perf_counter()
+
+    def finish(self, trace, end: str = "game") -> None:
+        """Stamp the end stage and record every stage of the trace up to it, called when the game reads the value
+
+        A process that only sees part of the path, like the plot window, can end the trace at an earlier stage that is
+        already stamped.
+        """
+        if trace is None or "game" in trace:
+            return
+        if end not in trace:
+            trace[end] = time.perf_counter()
+        previous = trace["sample"]
+        row = [round(trace["micros"])]
+        for stage in STAGES[:STAGES.index(end) + 1]:
+            latency = (trace[stage] - previous) * 1000
+            previous = trace[stage]
+            self.latencies[stage].append(latency)
+            self.counts[stage] += 1
+            row.append(round(latency, 3))
+        total = (trace[end] - trace["sample"]) * 1000
+        self.latencies["total"].append(total)
+        self.counts["total"] += 1
+        row.append(round(total, 3))
+        with self.lock:
+            # The game thread can still finish a trace after close()
+            if self.writer is not None:
+                self.writer.writerow(row)
+
+    def percentiles(self) -> dict:
+        """{stage: (p50, p95, p99)} in ms over the latest traces"""
+        result = {}
+        for stage, latencies in self.latencies.items():
+            count = min(self.counts[stage], latencies.size)
+            if count:
+                result[stage] = tuple(np.percentile(latencies.view()[-count:], [50, 95, 99]))
+        return result
+
+    def report(self) -> str:
+        lines = [f"{stage}: p50 {p50:.1f} / p95 {p95:.1f} / p99 {p99:.1f} ms"
+                 for stage, (p50, p95, p99) in self.percentiles().items()]
+        if self.log_file is not None:
+            with self.lock:
+                self.log_file.flush()
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        if self.log_file is not None:
+            print("Latency:\n" + self.report())
+            with self.lock:
+                self.log_file.close()
+                self.log_file = None
+                self.writer = None
@@ -0,0 +1,38 @@
+import numpy as np
+
+class RingBuffer:
+    """Fixed-size circular buffer that always exposes the newest `size` rows as one contiguous array"""
+    def __init__(self, size: int, channels: int = None, dtype=float, fill_value=0) -> None:
+        self.size = size
+        # Every row is written twice, at index and index + size, so view() never has to copy around the wrap
+        shape = (2 * size,) if channels is None else (2 * size, channels)
+        self.data = np.full(shape, fill_value, dtype=dtype)
+        self.index = 0  # Position the next row is written to
+
+    def extend(self, block: np.ndarray) -> None:
+        block = np.asarray(block, dtype=self.data.dtype)
+        n = len(block)
+        if n == 0:
+            return
+        if n > self.size:
+            block = block[-self.size:]
+            n = self.size
+
+        first = min(n, self.size - self.index)
+        self.data[self.index:self.index + first] = block[:first]
+        self.data[self.index + self.size:self.index + self.size + first] = block[:first]
+        rest = n - first
+        if rest:
+            self.data[:rest] = block[first:]
+            self.data[self.size:self.size + rest] = block[first:]
+        self.index = (self.index + n) % self.size
+
+    def append(self, value) -> None:
+        self.extend(np.asarray(value, dtype=self.data.dtype)[np.newaxis])
+
+    def view(self) -> np.ndarray:
+        # Oldest row first, newest row last - same order as the old np.roll based arrays
+        return self.data[self.index:self.index + self.size]
+
+    def latest(self):
+        return self.data[self.index + self.size - 1]
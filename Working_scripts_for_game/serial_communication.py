@@ -0,0 +1,199 @@
+import numpy as np
+import serial
+from threading import Thread
+from queue import Queue
+import logging
+import time
+
+BLOCK_INTERVAL = 0.01  # Time between block hand-offs to the data queue (s)
+BLOCK_SIZE = 512  # Maximum number of samples per block
+READ_TIMEOUT = 0.1  # Longest a blocking read waits for data before the reader re-checks stop_thread (s)
+
+# Binary frame layout - must match BINARY_FRAMES in 2_emg_sensor_game.cpp
+# | sync (uint16) | seq (uint16) | micros (uint32) | N x value (uint16) | checksum (uint16) |
+# All fields are little endian. The checksum is the 16-bit sum of every word between sync and checksum.
+FRAME_SYNC = 0xA55A
+FRAME_SYNC_BYTES = FRAME_SYNC.to_bytes(2, "little")
+
+def frame_dtype(num_sensors: int) -> np.dtype:
+    return np.dtype([
+        ("sync", "<u2"),
+        ("seq", "<u2"),
+        ("timestamp", "<u4"),
+        ("values", "<u2", (num_sensors,)),
+        ("checksum", "<u2"),
+    ])
+
+class FrameDecoder:
+    def __init__(self, num_sensors: int) -> None:
+        self.num_sensors = num_sensors
+        self.dtype = frame_dtype(num_sensors)
+        self.frame_size = self.dtype.itemsize
+        self.buffer = bytearray()
+        self.last_seq = None
+        self.dropped_frames = 0  # Frames missing according to the sequence number
+        self.corrupt_frames = 0  # Sync or checksum failures, each one costs a resync
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        """Return every complete frame in the buffer as an (n, num_sensors + 1) float array"""
+        self.buffer += chunk
+        blocks = []
+        while True:
+            start = self.buffer.find(FRAME_SYNC_BYTES)
+            if start < 0:
+                # Keep the last byte, it may be the first half of the next sync word
+                del self.buffer[:-1]
+                break
+
+            n = (len(self.buffer) - start) // self.frame_size
+            if n == 0:
+                del self.buffer[:start]
+                break
+
+            raw = bytes(self.buffer[start:start + n * self.frame_size])
+            frames = np.frombuffer(raw, dtype=self.dtype)
+            words = np.frombuffer(raw, dtype="<u2").reshape(n, -1)
+            checksums = (words[:, 1:-1].sum(axis=1, dtype=np.uint32) & 0xFFFF).astype(np.uint16)
+            valid = (frames["sync"] == FRAME_SYNC) & (checksums == frames["checksum"])
+            good = n if valid.all() else int(np.argmin(valid))
+
+            if good:
+                frames = frames[:good]
+                self.count_dropped(frames["seq"])
+                block = np.empty((good, self.num_sensors + 1))
+                block[:, 0] = frames["timestamp"]
+                block[:, 1:] = frames["values"]
+                blocks.append(block)
+
+            consumed = start + good * self.frame_size
+            if good < n:
+                # Skip the bad sync word and search for the next one
+                self.corrupt_frames += 1
+                consumed += 1
+            del self.buffer[:consumed]
+
+            if good == n:
+                break
+
+        if not blocks:
+            return np.empty((0, self.num_sensors + 1))
+        return np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+
+    def count_dropped(self, seq: np.ndarray) -> None:
+        seq = seq.astype(np.int64)
+        if self.last_seq is not None:
+            seq = np.concatenate(([self.last_seq], seq))
+        gaps = (np.diff(seq) - 1) % 0x10000
+        self.dropped_frames += int(gaps.sum())
+        self.last_seq = int(seq[-1])
+
+class SerialReader:
+    """Reads samples in a background thread and puts (n, NUM_OF_SENSORS + 1) blocks on data_queue"""
+    def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int, mode: str = "csv",
+                 block_interval: float = BLOCK_INTERVAL, block_size: int = BLOCK_SIZE, monitor=None) -> None:
+        if mode not in ("csv", "binary"):
+            raise ValueError(f"Unknown serial mode: {mode}. Expected 'csv' or 'binary'.")
+        self.ser = serial.Serial(port, baud_rate, timeout=READ_TIMEOUT)
+        self.ser.flushInput()
+        self.data_queue = Queue()
+        self.stop_thread = False
+        self.NUM_OF_SENSORS = NUM_OF_SENSORS
+        self.mode = mode
+        self.decoder = FrameDecoder(NUM_OF_SENSORS)
+        self.line_buffer = bytearray()  # Partial CSV line carried over to the next read
+        self.block_interval = block_interval
+        self.block_size = block_size
+        self.block = np.empty((block_size, NUM_OF_SENSORS + 1))
+        self.block_len = 0
+        self.last_flush = time.perf_counter()
+        self.monitor = monitor  # LatencyMonitor told when the newest sample of each block was read
+        self.last_receive = self.last_flush  # When the chunk holding the newest sample was read
+        self.thread = Thread(target=self.read_from_serial)
+        self.thread.start()
+
+    def read_from_serial(self) -> None:
+        if self.mode == "binary":
+            self.read_binary_frames()
+        else:
+            self.read_csv_lines()
+
+    def read_chunk(self) -> bytes:
+        # Blocks until at least one byte arrives or READ_TIMEOUT passes, then takes everything buffered
+        chunk = self.ser.read(self.ser.in_waiting or 1)
+        self.last_receive = time.perf_counter()
+        return chunk
+
+    def read_csv_lines(self) -> None:
+        while not self.stop_thread:
+            try:
+                self.line_buffer += self.read_chunk()
+                end = self.line_buffer.rfind(b"\n")
+                if end >= 0:
+                    lines = self.line_buffer[:end].split(b"\n")
+                    del self.line_buffer[:end + 1]
+                    for line in lines:
+                        self.parse_csv_line(line)
+                self.flush_if_due()
+            except (OSError, serial.SerialException) as e:
+                logging.error("Error reading from serial port", exc_info=True)
+                break
+
+    def parse_csv_line(self, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            # Empty fields are skipped, some sketches end every line with a comma
+            data = [float(value) for value in line.split(b",") if value]
+            if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
+                raise ValueError(f"Received invalid data: {line.decode('utf-8', 'replace')}. Expected {self.NUM_OF_SENSORS + 1} values.")
+            self.append_sample(data)
+        except ValueError as e:
+            logging.error(e, exc_info=True)
+
+    def read_binary_frames(self) -> None:
+        while not self.stop_thread:
+            try:
+                self.append_samples(self.decoder.decode(self.read_chunk()))
+                self.flush_if_due()
+            except (OSError, serial.SerialException) as e:
+                logging.error("Error reading from serial port", exc_info=True)
+                break
+
+    def append_sample(self, data: list) -> None:
+        self.block[self.block_len] = data
+        self.block_len += 1
+        if self.block_len == self.block_size:
+            self.flush_block()
+
+    def append_samples(self, samples: np.ndarray) -> None:
+        while len(samples):
+            count = min(self.block_size - self.block_len, len(samples))
+            self.block[self.block_len:self.block_len + count] = samples[:count]
+            self.block_len += count
+            samples = samples[count:]
+            if self.block_len == self.block_size:
+                self.flush_block()
+
+    def flush_if_due(self) -> None:
+        if time.perf_counter() - self.last_flush >= self.block_interval:
+            self.flush_block()
+
+    def flush_block(self) -> None:
+        # Hand the filled rows to the consumer and start a fresh block, the consumer owns the old array
+        if self.block_len:
+            if self.monitor is not None:
+                self.monitor.received(self.block[self.block_len - 1, 0], self.last_receive)
+            self.data_queue.put(self.block[:self.block_len])
+            self.block = np.empty((self.block_size, self.NUM_OF_SENSORS + 1))
+            self.block_len = 0
+        self.last_flush = time.perf_counter()
+
+    def stop(self) -> None:
+        self.stop_thread = True
+        if self.thread.is_alive():
+            self.thread.join()
+        self.flush_block()
+        self.ser.close()
+        if self.mode == "binary" and (self.decoder.dropped_frames or self.decoder.corrupt_frames):
+            logging.error(f"Binary stream lost {self.decoder.dropped_frames} frames, {self.decoder.corrupt_frames} corrupt frames skipped")
@@ -0,0 +1,75 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+class SharedRingBuffer:
+    """Fixed-size circular buffer of float rows in shared memory, one writer process and any number of readers
+
+    The header works like a seqlock: the writer raises `started` to the row count it is about to reach, copies the
+    rows in and only then raises `count`. A reader copies up to `count` and afterwards checks `started`, any row
+    whose slot a write may have touched meanwhile is dropped and reported lost, so readers never wait on a lock.
+    A reader that falls more than `size` rows behind loses the oldest rows the same way.
+    Passing the buffer to a multiprocessing.Process attaches the child to the same memory.
+    """
+    def __init__(self, size: int, channels: int, name: str = None) -> None:
+        self.size = size
+        self.channels = channels
+        self.owner = name is None  # The process that created the memory is the one that frees it
+        nbytes = 16 + size * channels * 8  # int64 started and finished row counts, then the float64 rows
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes)
+        self.started = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)  # Rows written once the current write ends
+        self.count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=8)  # Rows completely written
+        self.data = np.ndarray((size, channels), dtype=float, buffer=self.shm.buf, offset=16)
+        if self.owner:
+            self.started[0] = 0
+            self.count[0] = 0
+
+    def __reduce__(self):
+        return (SharedRingBuffer, (self.size, self.channels, self.shm.name))
+
+    def extend(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=float).reshape(-1, self.channels)
+        n = len(rows)
+        if n > self.size:
+            rows = rows[-self.size:]  # Counted as written, readers see the rest as lost
+        count = int(self.count[0])
+        self.started[0] = count + n
+        index = (count + n - len(rows)) % self.size
+        first = min(len(rows), self.size - index)
+        self.data[index:index + first] = rows[:first]
+        self.data[:len(rows) - first] = rows[first:]
+        self.count[0] = count + n
+
+    def append(self, row) -> None:
+        self.extend(np.asarray(row, dtype=float)[np.newaxis])
+
+    def written(self) -> int:
+        return int(self.count[0])
+
+    def read_new(self, position: int) -> tuple:
+        """(rows written since position, new position, rows lost because the writer lapped this reader)"""
+        count = int(self.count[0])
+        start = max(position, count - self.size)
+        indices = np.arange(start, count) % self.size
+        rows = self.data[indices]
+        # Slots of rows below started - size were, or are being, rewritten since count was read
+        overwritten = min(max(0, int(self.started[0]) - self.size - start), len(rows))
+        if overwritten:
+            rows = rows[overwritten:]
+        return rows, count, start - position + overwritten
+
+    def latest(self):
+        """(row number, copy of the newest row), None before anything is written"""
+        count = int(self.count[0])
+        if count == 0:
+            return None
+        row = self.data[(count - 1) % self.size].copy()
+        if int(self.started[0]) - count >= self.size:
+            return self.latest()  # A write reached this slot while it was copied, the copy may be torn
+        return count, row
+
+    def close(self) -> None:
+        # The array views have to go before the memory can be closed
+        del self.started, self.count, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
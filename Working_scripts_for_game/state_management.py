@@ -0,0 +1,172 @@
+import numpy as np
+from ring_buffer import RingBuffer
+
+STATE_WINDOW_MS = 250  # Sample time the state counters cover, a decision never depends on older samples
+WINDOW_CAPACITY = 4096  # Most samples a time window can hold, about 4 s of data at the Arduino's ~1 kHz
+SAMPLES_PER_MS = 1.0  # The Arduino's nominal rate, sizes a window_ms window in samples when no timestamps are given
+MICROS_WRAP = 2 ** 32  # Arduino micros() rolls over after about 71 minutes
+
+class State:
+    def __init__(self, name: str, threshold: float) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.counter = 0
+
+    def __str__(self) -> str:
+        return self.name
+
+class SlidingWindowCounter:
+    """Per-state sample counts over the last `window` samples, or over the last `window_ms` of sample time
+
+    The state of every recent sample is kept in a circular buffer. Counts after each sample of a block come
+    from cumulative sums over the buffered window plus the block, so a block costs O(window + block).
+    """
+    def __init__(self, num_states: int, window: int = None, window_ms: float = None,
+                 capacity: int = WINDOW_CAPACITY) -> None:
+        if (window is None) == (window_ms is None):
+            raise ValueError("Give either a window in samples or a window_ms")
+        self.num_states = num_states
+        self.window = window
+        self.window_ms = window_ms
+        self.capacity = window if window is not None else capacity
+        # Empty slots hold state -1 at time -inf, they are never counted
+        self.states = RingBuffer(self.capacity, dtype=np.int64, fill_value=-1)
+        self.times = RingBuffer(self.capacity, fill_value=-np.inf)
+        self.counts = np.zeros(num_states, dtype=np.int64)
+        self.last_micros = None
+        self.wrap_offset = 0.0
+
+    def unwrap(self, timestamps) -> np.ndarray:
+        # micros() restarts from 0 on rollover, the window needs times that keep increasing
+        raw = np.asarray(timestamps, dtype=float)
+        previous = np.concatenate(([raw[0] if self.last_micros is None else self.last_micros], raw[:-1]))
+        wraps = np.cumsum(raw < previous)
+        times = raw + (self.wrap_offset + wraps * MICROS_WRAP)
+        self.wrap_offset += wraps[-1] * MICROS_WRAP
+        self.last_micros = raw[-1]
+        return times
+
+    def reset(self) -> None:
+        self.states.extend(np.full(self.capacity, -1))
+        self.times.extend(np.full(self.capacity, -np.inf))
+        self.counts = np.zeros(self.num_states, dtype=np.int64)
+
+    def update(self, states: np.ndarray, timestamps: np.ndarray = None) -> np.ndarray:
+        """Add a block of state indices (-1 for none), returns the (n, num_states) window counts after each sample
+
+        timestamps are the Arduino micros() of each sample. Without them a window_ms window counts the last
+        window_ms * SAMPLES_PER_MS samples instead.
+        """
+        n = len(states)
+        if n == 0:
+            return np.empty((0, self.num_states), dtype=np.int64)
+        history = self.capacity
+        timeline = np.concatenate((self.states.view(), states))
+        ends = np.arange(history + 1, history + n + 1)  # Each sample's window ends with that sample
+        if self.window_ms is None:
+            starts = ends - self.window
+        elif timestamps is None:
+            starts = ends - min(max(1, round(self.window_ms * SAMPLES_PER_MS)), self.capacity)
+            # Kept at the newest known time, so the buffered times stay sorted for later timed blocks
+            self.times.extend(np.full(n, self.times.view()[-1]))
+        else:
+            times = np.concatenate((self.times.view(), self.unwrap(timestamps)))
+            starts = np.searchsorted(times, times[history:] - self.window_ms * 1000, side='right')
+            starts = np.maximum(starts, ends - self.capacity)
+            self.times.extend(times[history:])
+
+        # Only the part of the timeline some window reaches back to is summed
+        first = starts.min()
+        hits = timeline[first:, np.newaxis] == np.arange(self.num_states)
+        cumulative = np.zeros((len(hits) + 1, self.num_states), dtype=np.int64)
+        np.cumsum(hits, axis=0, out=cumulative[1:])
+        counts = cumulative[ends - first] - cumulative[starts - first]
+        self.states.extend(states)
+        self.counts = counts[-1]
+        return counts
+
+class StateManager:
+    """Decides the state of one sensor from the filtered samples in a sliding window
+
+    A sample goes to the state with the highest threshold below abs(value). The decision is the state with the
+    most samples in the window, so it follows muscle activation with the same delay whatever the GUI is doing.
+    """
+    def __init__(self, sensor_num, states, widget=None, window: int = None, window_ms: float = None) -> None:
+        self.sensor_num = sensor_num
+        self.states = states
+        self.current_state = None
+        self.widget = widget
+        if window is None and window_ms is None:
+            window_ms = STATE_WINDOW_MS
+        self.counter = SlidingWindowCounter(len(states), window, window_ms)
+        self.running = np.zeros((0, len(states)), dtype=np.int64)  # Window counts after each sample of the last block
+        self.highest = 0  # Index of the state get_state_with_highest_count returns
+        self.sort_thresholds()
+
+    def sort_thresholds(self) -> None:
+        # States by descending threshold, equal thresholds in list order, as sorted(..., reverse=True) gives them.
+        # Stored reversed (ascending) for searchsorted
+        descending = sorted(range(len(self.states)), key=lambda i: self.states[i].threshold, reverse=True)
+        self.ascending_order = np.array(descending[::-1], dtype=np.int64)
+        self.ascending_thresholds = np.array([self.states[i].threshold for i in descending[::-1]], dtype=float)
+
+    def reset_counters(self) -> None:
+        self.counter.reset()
+        self.highest = 0
+        for state in self.states:
+            state.counter = 0
+
+    def classify(self, values) -> np.ndarray:
+        """Index of the state every value falls into, -1 where no threshold is crossed"""
+        magnitudes = np.abs(np.asarray(values, dtype=float))
+        # Thresholds strictly below each magnitude, the highest of them is the one the sample crosses
+        below = np.searchsorted(self.ascending_thresholds, magnitudes, side='left')
+        crossed = np.full(len(magnitudes), -1, dtype=np.int64)
+        crossed[below > 0] = self.ascending_order[below[below > 0] - 1]
+        return crossed
+
+    def update_block(self, values, timestamps=None) -> np.ndarray:
+        """Classify a block of filtered values into the window, returns the state index per sample"""
+        crossed = self.classify(values)
+        if len(crossed) == 0:
+            return crossed
+        self.running = self.counter.update(crossed, timestamps)
+        counts = self.counter.counts
+        for state, count in zip(self.states, counts.tolist()):
+            state.counter = count
+
+        # np.argmax keeps the first of equal counts, like the stable sort get_state_with_highest_count used
+        self.highest = int(np.argmax(counts))
+        # The shown state only changes once another state has strictly more samples in the window
+        current = None if self.current_state is None else self.states.index(self.current_state)
+        if counts[self.highest] > 0 and (current is None or counts[current] < counts[self.highest]):
+            self.current_state = self.states[self.highest]
+
+        if self.widget is not None and self.current_state is not None:
+            self.widget.setText(f"Sensor {self.sensor_num}: {self.current_state.name}")
+        return crossed
+
+    def highest_counts(self, last: int = None) -> list:
+        """get_state_with_highest_count as it stood after each sample of the last block, only the last `last` when given"""
+        running = self.running if last is None else self.running[len(self.running) - min(last, len(self.running)):]
+        leaders = np.argmax(running, axis=1)
+        return [(self.states[i].name, count) for i, count in zip(leaders.tolist(), running[np.arange(len(running)), leaders].tolist())]
+
+    def update_state(self, value, timestamp=None) -> None:
+        # One sample, without a timestamp a window_ms window falls back to a window in samples
+        self.update_block([value], None if timestamp is None else [timestamp])
+
+    def update_threshold(self, state_name: str, new_threshold: float) -> None:
+        for state in self.states:
+            if state.name == state_name:
+                state.threshold = new_threshold
+                print(f"Threshold for {state.name} updated to: {new_threshold}")
+                break
+        self.sort_thresholds()
+
+    def get_state_with_highest_count(self) -> tuple:
+        if not self.states:
+            return None  # If there are no states, return None
+
+        highest_count_state = self.states[self.highest]
+        return (highest_count_state.name, highest_count_state.counter)
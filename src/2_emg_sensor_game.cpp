@@ -1,9 +1,22 @@
 #include <Arduino.h>
 
 #define NUMBER_OF_SENSORS 2 // Define the number of sensors connected to the Arduino
+#define BINARY_FRAMES 0 // Set to 1 to stream fixed-size binary frames instead of CSV lines (SERIAL_MODE = "binary" in Python)
+#define FRAME_SYNC 0xA55A // Sync word at the start of every binary frame
 
 int analog_pins[NUMBER_OF_SENSORS] = {A0, A1}; // Define an array with the pins connected to the sensors. Change the values to match your own setup.
 
+// Binary frame layout - must match frame_dtype in serial_communication.py (little endian, no padding)
+struct __attribute__((packed)) Frame {
+  uint16_t sync;
+  uint16_t seq;
+  uint32_t timestamp;
+  uint16_t values[NUMBER_OF_SENSORS];
+  uint16_t checksum; // 16-bit sum of every word between sync and checksum
+};
+
+Frame frame;
+
 void setup() {
   // Set each pin in analog_pins as input
   for(int i = 0; i < NUMBER_OF_SENSORS; i++) {
@@ -11,9 +24,27 @@ void setup() {
   }
   
   Serial.begin(115200);  // Start serial communication at 115200 bps
+
+  frame.sync = FRAME_SYNC;
+  frame.seq = 0;
 }
 
 void loop() {
+#if BINARY_FRAMES
+  frame.timestamp = micros(); // overflows at 70 minutes
+  for(int i = 0; i < NUMBER_OF_SENSORS; i++) {
+    frame.values[i] = abs(analogRead(analog_pins[i]));
+  }
+
+  uint16_t checksum = frame.seq + (uint16_t)(frame.timestamp & 0xFFFF) + (uint16_t)(frame.timestamp >> 16);
+  for(int i = 0; i < NUMBER_OF_SENSORS; i++) {
+    checksum += frame.values[i];
+  }
+  frame.checksum = checksum;
+
+  Serial.write((uint8_t *)&frame, sizeof(frame));
+  frame.seq++;
+#else
   // Get the current time since the program started
   String dataString = String(micros()) + ",";
 
@@ -24,6 +55,7 @@ void loop() {
     // }
   // Print the data string to the Serial Monitor
   Serial.println(dataString);
+#endif
  
 
   
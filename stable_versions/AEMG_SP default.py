@@ -1,10 +1,9 @@
 import numpy as np
-import serial
-from threading import Thread, Lock
+from threading import Lock
 import pandas as pd
-from queue import Queue
 import os
 import logging
+import sys
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
@@ -12,6 +11,10 @@ from serial.tools import list_ports
 import datetime
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Working_scripts_for_game'))
+from serial_communication import SerialReader
+from ring_buffer import RingBuffer
+
 NUM_OF_SENSORS = 2  # Number of sensors connected to the Arduino
 BUFFER_SIZE = 1024  # Buffer size for serial port reading
 RECORD_DELAY = 3000  # Delay before recording starts (ms)
@@ -23,44 +26,11 @@ sensor_placement_dict = {1:"Outer forearm sensor value (1)", 2: "Inner forearm s
 # Set up logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, num_sensors: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.num_sensors = num_sensors
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.num_sensors + 1:  # expect timestamp + n sensor values
-                        raise ValueError
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(f"Received invalid data: {line}", exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
 class DataPlotter:
     def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
         self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.num_sensors)]
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, reader.NUM_OF_SENSORS)
         self.record_data = []
         self.record_lock = Lock()
         self.is_recording = False
@@ -90,7 +60,7 @@ class DataPlotter:
         self.toggle_y_axis_button.clicked.connect(self.toggle_y_axis)
 
     def setup_plot(self) -> None:
-        self.plot = [self.win.addPlot(title = sensor_placement_dict[i+1] + " data") for i in range(self.reader.num_sensors)]
+        self.plot = [self.win.addPlot(title = sensor_placement_dict[i+1] + " data") for i in range(self.reader.NUM_OF_SENSORS)]
         self.curve = [p.plot(pen='y') for p in self.plot]
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
@@ -117,7 +87,7 @@ class DataPlotter:
         if file_title:
             file_path = os.path.join('output', 'gesture recordings', f'{file_title}.csv')
             with self.record_lock:
-                df = pd.DataFrame(self.record_data, columns=['global_time', 'timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.num_sensors)])
+                df = pd.DataFrame(self.record_data, columns=['global_time', 'timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.NUM_OF_SENSORS)])
 
             df.to_csv(file_path, index=False, chunksize=1000)
             self.label.setText(f'Saved recording as {file_title}.csv')
@@ -135,28 +105,28 @@ class DataPlotter:
                 p.enableAutoRange(axis='y')
             self.is_auto_scaled = True
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
-
     def update(self) -> None:
+        # Drain every block that arrived since the last update, then redraw each curve once
+        blocks = []
         while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
-            if self.is_recording:
-                # Get the current formatted global time
-                current_time_seconds = time.time()
-                # current_datetime = datetime.datetime.fromtimestamp(current_time_seconds)
-                # formatted_time = current_datetime.strftime('%H:%M:%S.%f')[:-3]
-
-                with self.record_lock:
-                    # Append formatted_time to the record data
-                    self.record_data.append([current_time_seconds] + data)
-
-            for i, value in enumerate(data[1:]):
-                self.value_data[i] = self.shift_and_append(self.value_data[i], value)
-                self.curve[i].setData(self.time_data, self.value_data[i])
+            blocks.append(self.reader.data_queue.get())
+        if not blocks:
+            return
+        block = np.concatenate(blocks)
+        if self.is_recording:
+            # Get the current formatted global time
+            current_time_seconds = time.time()
+            # current_datetime = datetime.datetime.fromtimestamp(current_time_seconds)
+            # formatted_time = current_datetime.strftime('%H:%M:%S.%f')[:-3]
+
+            with self.record_lock:
+                # Append formatted_time to the record data
+                self.record_data.extend(np.column_stack((np.full(len(block), current_time_seconds), block)).tolist())
+
+        self.time_data.extend(block[:, 0])
+        self.value_data.extend(block[:, 1:])
+        for i, curve in enumerate(self.curve):
+            curve.setData(self.time_data.view(), self.value_data.view()[:, i])
 
     def start(self) -> None:
         QApplication.instance().exec_()
@@ -1,10 +1,8 @@
 import numpy as np
-import serial
-from threading import Thread, Lock
-import pandas as pd
-from queue import Queue
+from threading import Lock
 import os
 import logging
+import sys
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
@@ -12,10 +10,20 @@ from serial.tools import list_ports
 import datetime
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'working_scirpts_for_dataset', 'wrist_angle_dataset'))
+from emg_recording import StreamingRecorder, BINARY_EXTENSION, in_progress_path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Working_scripts_for_game'))
+from serial_communication import SerialReader
+from ring_buffer import RingBuffer
+from frame_timer import FrameTimer
+
 NUM_OF_SENSORS = 7  # 2 EMG sensors + 3 touch sensors
 BUFFER_SIZE = 1024  # Buffer size for serial port reading
 RECORD_DELAY = 3000  # Delay before recording starts (ms)
 RECORD_DURATION = 600000  # Duration of recording (ms)
+RECORD_FORMAT = "csv"  # "csv" or "binary" - binary writes a compact .emg file plus .json metadata, see emg_recording.py
+TARGET_FPS = 30  # Plot redraws per second, samples are drained into the buffers once per frame
+FRAME_STATS_INTERVAL = 2.0  # Time between frame time readouts (s)
 
 sensor_placement_dict = {
     1: "Outer forearm sensor value (1)",
@@ -31,51 +39,20 @@ sensor_placement_dict = {
 # Set up logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, num_sensors: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.num_sensors = num_sensors
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.num_sensors + 1:  # expect timestamp + n sensor values
-                        raise ValueError
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(f"Received invalid data: {line}", exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
 class DataPlotter:
     def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
         self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.num_sensors)]
-        self.record_data = []
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, reader.NUM_OF_SENSORS)
+        self.recorder = None  # StreamingRecorder for the recording in progress
         self.record_lock = Lock()
         self.is_recording = False
         self.is_auto_scaled = True
+        self.frame_timer = FrameTimer()
         self.setup_ui()
         self.setup_plot()
         QApplication.instance().aboutToQuit.connect(self.reader.stop)
+        QApplication.instance().aboutToQuit.connect(self.close_recorder)
 
     def setup_ui(self) -> None:
         self.app = QApplication([])
@@ -93,16 +70,18 @@ class DataPlotter:
         self.container.layout().addWidget(self.file_name_edit)
         self.container.layout().addWidget(self.record_button)
         self.container.layout().addWidget(self.toggle_y_axis_button)
+        self.frame_time_label = QLabel('Frame time: -')
+        self.container.layout().addWidget(self.frame_time_label)
         self.container.show()
         self.record_button.clicked.connect(self.record_gesture)
         self.toggle_y_axis_button.clicked.connect(self.toggle_y_axis)
 
     def setup_plot(self) -> None:
-        self.plot = [self.win.addPlot(title = sensor_placement_dict[i+1] + " data") for i in range(self.reader.num_sensors)]
+        self.plot = [self.win.addPlot(title = sensor_placement_dict[i+1] + " data") for i in range(self.reader.NUM_OF_SENSORS)]
         self.curve = [p.plot(pen='y') for p in self.plot]
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
-        self.timer.start(50)
+        self.timer.start(int(1000 / TARGET_FPS))
 
     def start_countdown(self) -> None:
         self.label.setText('Recording will start in 3 seconds...')
@@ -110,29 +89,49 @@ class DataPlotter:
 
     def record_gesture(self) -> None:
         self.record_button.setEnabled(False)
-        with self.record_lock:
-            self.record_data = []
         self.start_countdown()
 
     def start_recording(self) -> None:
         self.label.setText('Recording...')
+        # Rows are streamed to disk while recording instead of being held in memory until the end.
+        # The title is only read when the recording stops, the file gets its name then
+        extension = BINARY_EXTENSION if RECORD_FORMAT == "binary" else '.csv'
+        file_path = in_progress_path(os.path.join('output', 'gesture recordings'), extension)
+        columns = ['global_time', 'timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.NUM_OF_SENSORS)]
+        dtypes = ['f8', 'u4'] + ['u2'] * self.reader.NUM_OF_SENSORS
+        with self.record_lock:
+            self.recorder = StreamingRecorder(file_path, columns, dtypes, {'sensor_placement_dict': sensor_placement_dict})
         self.is_recording = True
         QtCore.QTimer.singleShot(RECORD_DURATION, self.stop_recording)
 
     def stop_recording(self) -> None:
         self.is_recording = False
-        file_title = self.file_name_edit.text()
-        if file_title:
-            file_path = os.path.join('output', 'gesture recordings', f'{file_title}.csv')
-            with self.record_lock:
-                df = pd.DataFrame(self.record_data, columns=['global_time', 'timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.num_sensors)])
-
-            df.to_csv(file_path, index=False, chunksize=1000)
-            self.label.setText(f'Saved recording as {file_title}.csv')
+        try:
+            file_name = self.close_recorder(self.file_name_edit.text())
+        except RuntimeError as e:
+            self.label.setText(f'Recording failed: {e}')
         else:
-            self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
+            if file_name:
+                self.label.setText(f'Saved recording as {file_name}')
+            else:
+                self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
         self.record_button.setEnabled(True)
 
+    def close_recorder(self, file_title: str = '') -> str:
+        # Names the recording after file_title, without a title it is thrown away. Returns the saved file name,
+        # raises RuntimeError if the recording could not be written
+        with self.record_lock:
+            if self.recorder is None:
+                return None
+            recorder, self.recorder = self.recorder, None
+            if not file_title:
+                recorder.close(discard=True)
+                return None
+            file_name = file_title + os.path.splitext(recorder.file_path)[1]
+            # Waits for the last rows, so a failed write is reported here and not as a saved recording
+            recorder.close(wait=True, file_path=os.path.join(os.path.dirname(recorder.file_path), file_name))
+            return file_name
+
     def toggle_y_axis(self) -> None:
         if self.is_auto_scaled:
             for p in self.plot:
@@ -143,16 +142,16 @@ class DataPlotter:
                 p.enableAutoRange(axis='y')
             self.is_auto_scaled = True
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
-
     def update(self) -> None:
+        # Drain every block that arrived since the last frame, then redraw each curve once
+        frame_start = time.perf_counter()
+        blocks = []
         while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
-            if self.is_recording:
+            blocks.append(self.reader.data_queue.get())
+        block = np.concatenate(blocks) if blocks else np.empty((0, self.reader.NUM_OF_SENSORS + 1))
+
+        if len(block):
+            if self.is_recording and self.recorder is not None:
                 # Get the current formatted global time
                 current_time_seconds = time.time()
                 # current_datetime = datetime.datetime.fromtimestamp(current_time_seconds)
@@ -160,11 +159,21 @@ class DataPlotter:
 
                 with self.record_lock:
                     # Append formatted_time to the record data
-                    self.record_data.append([current_time_seconds] + data)
+                    self.recorder.write(np.column_stack((np.full(len(block), current_time_seconds), block)))
+
+            self.time_data.extend(block[:, 0])
+            self.value_data.extend(block[:, 1:])
+        drain_end = time.perf_counter()
+
+        if len(block):
+            for i, curve in enumerate(self.curve):
+                curve.setData(self.time_data.view(), self.value_data.view()[:, i])
+        draw_end = time.perf_counter()
 
-            for i, value in enumerate(data[1:]):
-                self.value_data[i] = self.shift_and_append(self.value_data[i], value)
-                self.curve[i].setData(self.time_data, self.value_data[i])
+        self.frame_timer.add(drain_end - frame_start, draw_end - drain_end, len(block))
+        if draw_end - self.frame_timer.started >= FRAME_STATS_INTERVAL:
+            self.frame_time_label.setText(f'Frame time: {self.frame_timer.summary()}')
+            self.frame_timer.reset()
 
     def start(self) -> None:
         QApplication.instance().exec_()
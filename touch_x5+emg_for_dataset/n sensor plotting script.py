@@ -1,17 +1,20 @@
 import os
-import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import webbrowser
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'working_scirpts_for_dataset', 'wrist_angle_dataset'))
+from emg_recording import list_recordings, load_recording
 
 # Directory containing the CSV files
 data_dir = "output/gesture recordings"
 
-# Get a sorted list of all CSV files in the directory
-csv_files = sorted([f for f in os.listdir(data_dir) if f.endswith(".csv")])
+# Get a sorted list of all CSV and binary recordings in the directory
+csv_files = list_recordings(data_dir)
 
-# Read all CSV files into a list of DataFrames
-dataframes = [pd.read_csv(os.path.join(data_dir, f)) for f in csv_files]
+# Read all recordings into a list of DataFrames
+dataframes = [load_recording(os.path.join(data_dir, f)) for f in csv_files]
 
 # Max number of columns across all CSV files (subtracting the 'timestamp' and 'global_time' columns)
 max_columns = max([len(df.columns) - 2 for df in dataframes])
@@ -2,6 +2,12 @@
 import pandas as pd
 import os
 from datetime import datetime
+import sys
+
+HELPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset')
+sys.path.append(HELPER_DIR)
+from alignment import find_nearest_angles
+from pipeline_cache import PipelineCache
 
 # Example file path (replace this with your actual file path)
 arm_angle_file_path = "working_scirpts_for_dataset/wrist_angle_dataset/previous_recordings/wrist+angle_recording_1691760899/TA_body_and_hand_landmarks_data_TimeVideo_20230808_160537.csv"
@@ -12,20 +18,20 @@ emg_filename = os.path.basename(emg_file_path)
 
 current_datetime = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
-# Load the datasets
-arm_angle_df = pd.read_csv(arm_angle_file_path)
-emg_df = pd.read_csv(emg_file_path)
-# Convert "x" to NaN and then interpolate
-arm_angle_df['angle'] = pd.to_numeric(arm_angle_df['angle'], errors='coerce')
-arm_angle_df['angle'].interpolate(method='linear', inplace=True)
+def merge_datasets():
+    # Load the datasets
+    arm_angle_df = pd.read_csv(arm_angle_file_path)
+    emg_df = pd.read_csv(emg_file_path)
+    # Convert "x" to NaN and then interpolate
+    arm_angle_df['angle'] = pd.to_numeric(arm_angle_df['angle'], errors='coerce')
+    arm_angle_df['angle'].interpolate(method='linear', inplace=True)
 
-# Merge datasets based on the closest timestamps
-def find_nearest_angle(timestamp):
-    diffs = abs(arm_angle_df['global_timestamp_ms'] - timestamp)
-    idx_min_diff = diffs.idxmin()
-    return arm_angle_df.iloc[idx_min_diff]['angle']
+    # Merge datasets based on the closest timestamps
+    emg_df['angle'] = find_nearest_angles(emg_df, arm_angle_df)
+    return emg_df
 
-emg_df['angle'] = emg_df['global_time'].apply(find_nearest_angle)
+# Unchanged input files, script, alignment helper and settings reuse the cached merge, so only a changed variant recomputes
+emg_df = PipelineCache().dataframe("linear_interpolation", [arm_angle_file_path, emg_file_path, __file__, os.path.join(HELPER_DIR, "alignment.py")], {"method": "linear"}, merge_datasets)
 
 # Save the merged dataset
 emg_df.to_csv("working_scirpts_for_dataset/wrist_angle_dataset/_output/linear_interpolation_"+arm_angle_filename[:-4]+"_"+current_datetime+".csv", index=False)
\ No newline at end of file
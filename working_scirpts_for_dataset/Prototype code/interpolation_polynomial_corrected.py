@@ -2,6 +2,14 @@
 import pandas as pd
 import os
 from datetime import datetime
+import sys
+
+HELPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset')
+sys.path.append(HELPER_DIR)
+from alignment import find_nearest_angles
+from pipeline_cache import PipelineCache
+
+INTERPOLATION_ORDER = 2  # Degree of the polynomial the gaps are filled with, also part of the cache key
 
 # Example file path (replace this with your actual file path)
 arm_angle_file_path = "working_scirpts_for_dataset/wrist_angle_dataset/previous_recordings/wrist+angle_recording_1691760899/TA_body_and_hand_landmarks_data_TimeVideo_20230808_160537.csv"
@@ -12,25 +20,25 @@ emg_filename = os.path.basename(emg_file_path)
 
 current_datetime = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
-# Load the datasets
-arm_angle_df = pd.read_csv(arm_angle_file_path)
-emg_df = pd.read_csv(emg_file_path)
-# Convert "x" to NaN and then interpolate
-arm_angle_df['angle'] = pd.to_numeric(arm_angle_df['angle'], errors='coerce')
-# Using polynomial interpolation for the 'angle' column. 
-# The 'order' parameter specifies the degree of the polynomial. 
-# Quadratic (order=2) is used as the default choice.
-# Adjust the 'order' parameter as needed. Higher orders might fit the data more closely but can also introduce oscillations.
-arm_angle_df['angle'].interpolate(method='polynomial', order=2, inplace=True)
-
-
-# Merge datasets based on the closest timestamps
-def find_nearest_angle(timestamp):
-    diffs = abs(arm_angle_df['global_timestamp_ms'] - timestamp)
-    idx_min_diff = diffs.idxmin()
-    return arm_angle_df.iloc[idx_min_diff]['angle']
-
-emg_df['angle'] = emg_df['global_time'].apply(find_nearest_angle)
+def merge_datasets():
+    # Load the datasets
+    arm_angle_df = pd.read_csv(arm_angle_file_path)
+    emg_df = pd.read_csv(emg_file_path)
+    # Convert "x" to NaN and then interpolate
+    arm_angle_df['angle'] = pd.to_numeric(arm_angle_df['angle'], errors='coerce')
+    # Using polynomial interpolation for the 'angle' column. 
+    # The 'order' parameter specifies the degree of the polynomial. 
+    # Quadratic (order=2) is used as the default choice.
+    # Adjust the 'order' parameter as needed. Higher orders might fit the data more closely but can also introduce oscillations.
+    arm_angle_df['angle'].interpolate(method='polynomial', order=INTERPOLATION_ORDER, inplace=True)
+
+
+    # Merge datasets based on the closest timestamps
+    emg_df['angle'] = find_nearest_angles(emg_df, arm_angle_df)
+    return emg_df
+
+# Unchanged input files, script, alignment helper and settings reuse the cached merge, so only a changed variant recomputes
+emg_df = PipelineCache().dataframe("polynomial_interpolation", [arm_angle_file_path, emg_file_path, __file__, os.path.join(HELPER_DIR, "alignment.py")], {"method": "polynomial", "order": INTERPOLATION_ORDER}, merge_datasets)
 
 # Save the merged dataset
 emg_df.to_csv("working_scirpts_for_dataset/wrist_angle_dataset/_output/polynomial_interpolation_"+arm_angle_filename[:-4]+"_"+current_datetime+".csv", index=False)
\ No newline at end of file
@@ -3,6 +3,11 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset'))
+from alignment import find_nearest_angles
 
 # Load the datasets
 arm_angle_df = pd.read_csv("working_scirpts_for_dataset/wrist_angle_dataset/_output/TA_body_and_hand_landmarks_data_TimeVideo_20230808_160537.csv")
@@ -16,12 +21,7 @@ arm_angle_df['angle'] = pd.to_numeric(arm_angle_df['angle'], errors='coerce')
 arm_angle_df['angle'].interpolate(method='linear', inplace=True)
 
 # Merge datasets based on the closest timestamps
-def find_nearest_angle(timestamp):
-    diffs = abs(arm_angle_df['global_timestamp_ms'] - timestamp)
-    idx_min_diff = diffs.idxmin()
-    return arm_angle_df.iloc[idx_min_diff]['angle']
-
-emg_df['angle'] = emg_df['global_time'].apply(find_nearest_angle)
+emg_df['angle'] = find_nearest_angles(emg_df, arm_angle_df)
 
 # Linear Regression
 X = emg_df[['Outer forearm sensor value (1)', 'Inner forearm sensor value (2)']]
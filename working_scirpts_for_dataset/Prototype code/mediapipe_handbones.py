@@ -1,13 +1,15 @@
 import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
-import cv2
-import numpy as np
 import time
 import os
 import glob
+import sys
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset'))
+from frame_source import FrameSource
+
 # STEP 1: Define time
 # Function to get current time in milliseconds
 def current_milli_time():
@@ -25,32 +27,9 @@ def current_milli_time():
 # video_file = video_files[0]
 
 
-# Create a VideoCapture object
-cap = cv2.VideoCapture("C:/Users/fkgde/Documents/PlatformIO/Projects/Internship 2023/output/official recordings/video/video mediapipe/20230802_112816.mp4")
-
-# Check if camera opened successfully
-if not cap.isOpened(): 
-    print("Error opening video file")
-
-# Read until video is completed
-frames = []
-while(cap.isOpened()):
-  
-  # Capture frame-by-frame
-  ret, frame = cap.read()
-  if ret == True:
-
-    # Append the frame to the frames list
-    frames.append(frame)
-
-  # Break the loop
-  else: 
-    break
-
-# Convert list of frames into a NumPy array
-video_as_np_array = np.array(frames)
-# print(len(video_as_np_array))
-cap.release()
+# Stream the frames instead of loading the whole video into memory, a decode thread keeps a few frames
+# ahead of the landmarker so memory stays constant whatever the video length
+frames = FrameSource("C:/Users/fkgde/Documents/PlatformIO/Projects/Internship 2023/output/official recordings/video/video mediapipe/20230802_112816.mp4")
 
 
 
@@ -58,8 +37,6 @@ cap.release()
 # STEP 3: Initialize the MediaPipe HandLandmarker
 model_path = 'C:/Users/fkgde/Documents/PlatformIO/Projects/Internship 2023/hand_landmarker.task'
 
-mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=video_as_np_array)
-
 BaseOptions = mp.tasks.BaseOptions
 HandLandmarker = mp.tasks.vision.HandLandmarker
 HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
@@ -75,14 +52,16 @@ frame_count = 0
 # STEP 4: Process the video frames with the hand landmarker
 with HandLandmarker.create_from_options(options) as landmarker:
     # The landmarker is initialized. Use it here.
-    
-    # frame_timestamp_ms = current_milli_time()
-    # frame_timestamp_ms = int(round(frame_count * (1000/30)))
-    frame_timestamp_ms = int(round(cap.get(cv2.CAP_PROP_POS_MSEC)))
-    print(frame_timestamp_ms)
-    hand_landmarker_result = landmarker.detect_for_video(mp_image, frame_timestamp_ms)
-    frame_count += 1
-    print(hand_landmarker_result)
+    for frame_idx, frame, rgb_frame in frames:
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+
+        # frame_timestamp_ms = current_milli_time()
+        # Video mode needs increasing timestamps, taken from the frame position like CAP_PROP_POS_MSEC
+        frame_timestamp_ms = int(round(frame_idx * 1000 / frames.fps))
+        print(frame_timestamp_ms)
+        hand_landmarker_result = landmarker.detect_for_video(mp_image, frame_timestamp_ms)
+        frame_count += 1
+        print(hand_landmarker_result)
 
 # When everything is done, release the video capture object
 
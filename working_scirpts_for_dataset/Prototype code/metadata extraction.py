@@ -37,35 +37,25 @@
 # creation_time = metadata['format'].get('tags', {}).get('creation_time', None)
 # print(creation_time)
 
-import subprocess
-import json
-import time
+import datetime
+import os
+import sys
 
-def extract_video_metadata(video_path):
-    cmd = [
-        'ffprobe',  # Or provide the full path to ffprobe if it's not in the PATH
-        # "C:/python38/lib/site-packages/ffprobe/ffprobe.py",
-        '-hide_banner',
-        '-loglevel', 'panic',  # suppresses most of the command-line output
-        '-print_format', 'json',
-        '-show_format',
-        '-show_streams',
-        video_path
-    ]
-
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return json.loads(result.stdout)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset'))
+from video_metadata import container_creation_time, filename_start_time
 
 # video_path = 'path_to_your_video.mp4'
 video_path = "output/official recordings/video/video mediapipe/TimeVideo_20230808_144011.mp4"
 
-metadata = extract_video_metadata(video_path)
-
-# If you want to extract the creation time:
-creation_time = metadata['format'].get('tags', {}).get('creation_time', None)
-print(creation_time)
+# The creation time ffprobe reported, read from the movie header in-process
+creation_time = container_creation_time(video_path)
+if creation_time is not None:
+    print(datetime.datetime.fromtimestamp(creation_time, datetime.timezone.utc).isoformat())
+else:
+    print(None)
 
-print(metadata)
+# The start time in the TimeVideo_YYYYMMDD_HHMMSS file name, what Step 02 uses by default
+print(filename_start_time(video_path))
 
 import datetime
 import time
@@ -1,24 +1,29 @@
 import numpy as np
-import serial
-from threading import Thread, Lock
-import pandas as pd
-from queue import Queue
+from threading import Lock
 import os
 import logging
+import sys
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QWidget, QSlider, QSpinBox
 from PyQt5.QtCore import Qt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore
-from collections import deque
 from serial.tools import list_ports
 from pynput import mouse
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wrist_angle_dataset'))
+from emg_recording import StreamingRecorder, BINARY_EXTENSION, in_progress_path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Working_scripts_for_game'))
+from serial_communication import SerialReader
+from filtering import FilterBank
+from ring_buffer import RingBuffer
+
 # ! Good values for alpha:0.5, Delay: 13/25/37 (roughly), Gain: 1.0
 
 NUM_OF_SENSORS = 2  # ! Number of sensors - check main.cpp for number expected
 BUFFER_SIZE = 1024  # Buffer size for serial port reading
 RECORD_DELAY = 3000  # Delay before recording starts (ms)
 RECORD_DURATION = 600000  # Duration of recording (ms)
+RECORD_FORMAT = "csv"  # "csv" or "binary" - binary writes a compact .emg file plus .json metadata, see emg_recording.py
 
 sensor_placement_dict = {1:"Outer forearm sensor value (1)", 2: "Inner forearm sensor value (2)"} # ! Update if more sensors are added
 
@@ -39,97 +44,24 @@ class MouseListener:
         elif button == mouse.Button.right:
             self.right_state = int(pressed)
 
-class LowPassFilter:
-    def __init__(self, alpha: float):
-        self.alpha = alpha
-        self.state = 0
-
-    def filter(self, value: float) -> float:
-        self.state = self.alpha * value + (1 - self.alpha) * self.state
-        return self.state
-
-class HighPassFilter:
-    def __init__(self, alpha: float):
-        self.alpha = alpha
-        self.low_pass_filter = LowPassFilter(alpha)
-        self.prev_raw_value = None
-        self.prev_high_passed_value = 0
-
-    def filter(self, value: float) -> float:
-        if self.prev_raw_value is None:
-            self.prev_raw_value = value
-        high_passed_value = self.alpha * self.prev_high_passed_value + self.alpha * (value - self.prev_raw_value)
-        self.prev_raw_value = value
-        self.prev_high_passed_value = high_passed_value
-        return high_passed_value
-
-class SerialReader:
-    def __init__(self, port: str, baud_rate: int, NUM_OF_SENSORS: int) -> None:
-        self.ser = serial.Serial(port, baud_rate)
-        self.ser.flushInput()
-        self.data_queue = Queue()
-        self.stop_thread = False
-        self.NUM_OF_SENSORS = NUM_OF_SENSORS
-        self.thread = Thread(target=self.read_from_serial)
-        self.thread.start()
-
-    def read_from_serial(self) -> None:
-        while not self.stop_thread:
-            try:
-                if self.ser.inWaiting():
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    data = list(map(float, line.split(",")))
-                    if len(data) != self.NUM_OF_SENSORS + 1:  # expect timestamp + n sensor values
-                        raise ValueError(f"Received invalid data: {line}. Expected {self.NUM_OF_SENSORS + 1} values.")
-                    self.data_queue.put(data)
-            except (OSError, serial.SerialException) as e:
-                logging.error("Error reading from serial port", exc_info=True)
-                break
-            except ValueError as e:
-                logging.error(e, exc_info=True)
-
-    def stop(self) -> None:
-        self.stop_thread = True
-        if self.thread.is_alive():
-            self.thread.join()
-        self.ser.close()
-
-class CombFilter:
-    def __init__(self, delay: int, gain: float) -> None:
-        self.delay = delay
-        self.gain = gain
-        self.buffer = deque()
-
-    def filter(self, signal: float) -> float:
-        self.buffer.append(signal)
-        if len(self.buffer) < self.delay:
-            return signal
-        else:
-            output = signal - self.gain * self.buffer[-self.delay]
-            self.buffer.popleft()  # remove oldest value
-            return output
-        
 class DataPlotter:
     def __init__(self, reader: SerialReader, plot_window: int = 500) -> None:
         self.reader = reader
-        self.time_data = np.zeros(plot_window)
-        self.value_data = [np.zeros(plot_window) for _ in range(reader.NUM_OF_SENSORS)]
-        self.record_data = []
+        self.time_data = RingBuffer(plot_window)
+        self.value_data = RingBuffer(plot_window, reader.NUM_OF_SENSORS)
+        self.recorder = None  # StreamingRecorder for the recording in progress
         self.record_lock = Lock()
         self.is_recording = False
         self.is_auto_scaled = True
         self.alpha = 0.1
-        self.comb_filters = [CombFilter(delay=0, gain=0) for _ in range(reader.NUM_OF_SENSORS)]
-        self.low_pass_filters = [LowPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
-        self.high_pass_filters = [HighPassFilter(alpha=self.alpha) for _ in range(reader.NUM_OF_SENSORS)]
+        self.filter_bank = FilterBank(reader.NUM_OF_SENSORS, alpha=self.alpha, delay=0, gain=0)
         self.setup_ui()
         self.setup_plot()
         QApplication.instance().aboutToQuit.connect(self.reader.stop)
+        QApplication.instance().aboutToQuit.connect(self.close_recorder)
         self.filters_enabled = True
-        self.mouse_left_data = np.zeros(plot_window)
-        self.mouse_right_data = np.zeros(plot_window)
+        self.mouse_left_data = RingBuffer(plot_window)
+        self.mouse_right_data = RingBuffer(plot_window)
 
 
     def toggle_filters(self):
@@ -233,10 +165,7 @@ class DataPlotter:
     def update_alpha(self, value):
         self.alpha = value / 100.0
         self.alpha_label.setText(f"Alpha: {self.alpha}")
-        for lp_filter in self.low_pass_filters:
-            lp_filter.alpha = self.alpha
-        for hp_filter in self.high_pass_filters:
-            hp_filter.alpha = self.alpha
+        self.filter_bank.alpha = self.alpha
 
     def update_y_range(self) -> None:
         if not self.is_auto_scaled:
@@ -256,13 +185,11 @@ class DataPlotter:
     def update_delay(self, value):
         value = int(value)
         self.delay_label.setText(f"Delay: {value}")
-        for filter in self.comb_filters:
-            filter.delay = value
+        self.filter_bank.delay = value
 
     def update_gain(self, value):
         self.gain_label.setText(f"Gain: {value/100}")
-        for filter in self.comb_filters:
-            filter.gain = value / 100
+        self.filter_bank.gain = value / 100
 
     def setup_plot(self) -> None:
         # self.plot = [self.win.addPlot(title=f"{sensor_placement_dict[i+1]} data") for i in range(self.reader.NUM_OF_SENSORS)]
@@ -277,57 +204,80 @@ class DataPlotter:
 
     def record_gesture(self) -> None:
         self.record_button.setEnabled(False)
-        with self.record_lock:
-            self.record_data = []
         self.start_countdown()
 
     def start_recording(self) -> None:
         self.label.setText('Recording...')
+        # Rows are streamed to disk while recording instead of being held in memory until the end.
+        # The title is only read when the recording stops, the file gets its name then
+        extension = BINARY_EXTENSION if RECORD_FORMAT == "binary" else '.csv'
+        file_path = in_progress_path(os.path.join('output', 'gesture recordings'), extension)
+        columns = ['timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.NUM_OF_SENSORS)] + ['left mouse button', 'right mouse button']
+        dtypes = ['u4'] + ['f4'] * self.reader.NUM_OF_SENSORS + ['u1', 'u1']
+        with self.record_lock:
+            self.recorder = StreamingRecorder(file_path, columns, dtypes, {'sensor_placement_dict': sensor_placement_dict})
         self.is_recording = True
         QtCore.QTimer.singleShot(RECORD_DURATION, self.stop_recording)
 
     def stop_recording(self) -> None:
         self.is_recording = False
-        file_title = self.file_name_edit.text()
-        if file_title:
-            file_path = os.path.join('output', 'gesture recordings', f'{file_title}.csv')
-            with self.record_lock:
-                df = pd.DataFrame(self.record_data, columns=['timestamp'] + [sensor_placement_dict[i+1] for i in range(self.reader.NUM_OF_SENSORS)] + ['left mouse button', 'right mouse button'])
-            df.to_csv(file_path, index=False, chunksize=1000)
-            self.label.setText(f'Saved recording as {file_title}.csv')
+        try:
+            file_name = self.close_recorder(self.file_name_edit.text())
+        except RuntimeError as e:
+            self.label.setText(f'Recording failed: {e}')
         else:
-            self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
+            if file_name:
+                self.label.setText(f'Saved recording as {file_name}')
+            else:
+                self.label.setText('Recording completed, but no file title was entered. Data was not saved.')
         self.record_button.setEnabled(True)
 
-    def shift_and_append(self, data_array: np.array, new_value: float) -> np.array:
-        data_array = np.roll(data_array, -1)
-        data_array[-1] = new_value
-        return data_array
+    def close_recorder(self, file_title: str = '') -> str:
+        # Names the recording after file_title, without a title it is thrown away. Returns the saved file name,
+        # raises RuntimeError if the recording could not be written
+        with self.record_lock:
+            if self.recorder is None:
+                return None
+            recorder, self.recorder = self.recorder, None
+            if not file_title:
+                recorder.close(discard=True)
+                return None
+            file_name = file_title + os.path.splitext(recorder.file_path)[1]
+            # Waits for the last rows, so a failed write is reported here and not as a saved recording
+            recorder.close(wait=True, file_path=os.path.join(os.path.dirname(recorder.file_path), file_name))
+            return file_name
 
     def update(self) -> None:
+        # Drain every block that arrived since the last update, then redraw each curve once
+        blocks = []
         while not self.reader.data_queue.empty():
-            data = self.reader.data_queue.get()
-            self.time_data = self.shift_and_append(self.time_data, data[0])
-
-            # Shift and append the current mouse states to the mouse state data arrays
-            self.mouse_left_data = self.shift_and_append(self.mouse_left_data, self.mouse_listener.left_state)
-            self.mouse_right_data = self.shift_and_append(self.mouse_right_data, self.mouse_listener.right_state)
-
-            if self.is_recording:
-                with self.record_lock:
-                    # Include mouse button states in the recorded data
-                    self.record_data.append([self.time_data[-1]] + [self.value_data[j][-1] for j in range(self.reader.NUM_OF_SENSORS)] + [self.mouse_left_data[-1], self.mouse_right_data[-1]])
-            for i, value in enumerate(data[1:]):
-                if self.filters_enabled:
-                    value = self.comb_filters[i].filter(value)  # Apply Comb filter
-                    value = self.low_pass_filters[i].filter(value)  # Apply Low Pass filter
-                    value = self.high_pass_filters[i].filter(value)  # Apply High Pass filter
-                self.value_data[i] = self.shift_and_append(self.value_data[i], value)
-                self.curve[i].setData(self.time_data, self.value_data[i])
-
-            # Update the mouse button plots
-            self.mouse_left_curve.setData(self.time_data, self.mouse_left_data)
-            self.mouse_right_curve.setData(self.time_data, self.mouse_right_data)
+            blocks.append(self.reader.data_queue.get())
+        if not blocks:
+            return
+        block = np.concatenate(blocks)
+        values = block[:, 1:]
+        if self.filters_enabled:
+            values = self.filter_bank.filter(values)  # Apply Comb, Low Pass and High Pass filters
+        self.time_data.extend(block[:, 0])
+        self.value_data.extend(values)
+
+        # The mouse states are read once per update and apply to the whole block
+        left_states = np.full(len(block), self.mouse_listener.left_state)
+        right_states = np.full(len(block), self.mouse_listener.right_state)
+        self.mouse_left_data.extend(left_states)
+        self.mouse_right_data.extend(right_states)
+
+        if self.is_recording and self.recorder is not None:
+            with self.record_lock:
+                # Include mouse button states in the recorded data
+                self.recorder.write(np.column_stack((block[:, 0], values, left_states, right_states)))
+
+        for i, curve in enumerate(self.curve):
+            curve.setData(self.time_data.view(), self.value_data.view()[:, i])
+
+        # Update the mouse button plots
+        self.mouse_left_curve.setData(self.time_data.view(), self.mouse_left_data.view())
+        self.mouse_right_curve.setData(self.time_data.view(), self.mouse_right_data.view())
 
     def start(self) -> None:
         QApplication.instance().exec_()
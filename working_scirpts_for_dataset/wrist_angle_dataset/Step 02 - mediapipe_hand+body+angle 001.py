@@ -1,134 +1,70 @@
-import datetime
-import cv2
-import mediapipe as mp
-import numpy as np
-import pandas as pd
-import time
-
-time_from_video_timestamp = "16:34:42.565"
-date_of_video_timestamp = "2023-09-08"
+import argparse
+import os
+from landmark_extraction import extract_landmarks, clear_checkpoint
+from video_metadata import video_start_timestamp
 
 folder_in_use = "working_scirpts_for_dataset/wrist_angle_dataset/__input/"
 filename = "TimeVideo_20230908_163442.mp4"
 file_in_use = folder_in_use + filename
 
-datetime_from_video_timestamp = (
-    date_of_video_timestamp + " " + time_from_video_timestamp
-)
-dt = datetime.datetime.strptime(datetime_from_video_timestamp, "%Y-%m-%d %H:%M:%S.%f")
-timestamp = dt.timestamp()
-difference_in_time = time.time() - timestamp
-start_timestamp_ms = time.time() - difference_in_time
-
-# Initialize MediaPipe Hands and Pose
-mp_hands = mp.solutions.hands
-mp_drawing = mp.solutions.drawing_utils
-mp_pose = mp.solutions.pose
-
-hands = mp_hands.Hands(
-    static_image_mode=False,
-    max_num_hands=1,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5,
-)
-pose = mp_pose.Pose(
-    static_image_mode=False,
-    model_complexity=1,
-    smooth_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5,
-)
-
-# Open video file
-cap = cv2.VideoCapture(file_in_use)
-
-fps = cap.get(cv2.CAP_PROP_FPS)
-
-# Initialize VideoWriter
-fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-out = cv2.VideoWriter(
-    "working_scirpts_for_dataset/wrist_angle_dataset/_output/body_and_hand_output_" + filename,
-    fourcc,
-    fps,
-    (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
-)
-
-# Prepare data storage for landmarks and timestamps
-landmarks_data = []
-frame_idx = 0
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Convert the BGR image to RGB
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Process the frame with MediaPipe Hands and Pose
-    hand_results = hands.process(rgb_frame)
-    pose_results = pose.process(rgb_frame)
-
-    # Draw hand landmarks on the frame
-    if hand_results.multi_hand_landmarks:
-        for hand_landmarks in hand_results.multi_hand_landmarks:
-            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-
-            for id, lm in enumerate(hand_landmarks.landmark):
-                landmarks_data.append(
-                    [
-                        "hand",
-                        start_timestamp_ms + (frame_idx / fps),
-                        frame_idx / fps * 1000,
-                        id,
-                        lm.x,
-                        lm.y,
-                        lm.z,
-                    ]
-                )
-
-    # Draw pose landmarks on the frame
-    if pose_results.pose_landmarks:
-        mp_drawing.draw_landmarks(
-            frame, pose_results.pose_landmarks, mp_pose.POSE_CONNECTIONS
-        )
-
-        for id, lm in enumerate(pose_results.pose_landmarks.landmark):
-            # global_timestamp_ms = (time.time() - difference_in_time)
-
-            landmarks_data.append(
-                [
-                    "pose",
-                    start_timestamp_ms + (frame_idx / fps),
-                    frame_idx / fps * 1000,
-                    id,
-                    lm.x,
-                    lm.y,
-                    lm.z,
-                ]
-            )
-
-    # Write the frame to the output video file
-    out.write(frame)
-
-    frame_idx += 1
-
-cap.release()
-out.release()
-
-# Convert landmarks_data to a pandas DataFrame and save to a .csv file
-landmarks_df = pd.DataFrame(
-    landmarks_data,
-    columns=[
-        "landmark_type",
-        "global_timestamp_ms",
-        "video_timestamp_ms",
-        "landmark_id",
-        "x",
-        "y",
-        "z",
-    ],
-)
-landmarks_df.to_csv(
-    "working_scirpts_for_dataset/wrist_angle_dataset/_output/body_and_hand_landmarks_data_" + filename[:-4] + ".csv", index=False
-)
+output_folder = "working_scirpts_for_dataset/wrist_angle_dataset/_output/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract hand and pose landmarks from the session video")
+    parser.add_argument("--video", default=file_in_use, help="Session video, TimeVideo_*.mp4")
+    parser.add_argument("--start-timestamp", type=float, default=None,
+                        help="Unix time of the first video frame in seconds, by default from video_metadata.KNOWN_START_TIMES "
+                             "or else the whole second in the file name or metadata")
+    parser.add_argument("--output-dir", default=output_folder, help="Folder the landmark files are written to")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to split the video across (0 = one per core, 1 = single process)")
+    parser.add_argument("--landmarks-only", action="store_true",
+                        help="Skip drawing and writing the annotated video, render it later with landmark_rendering.py")
+    parser.add_argument("--csv", action="store_true",
+                        help="Also write the long format landmark CSV next to the .npz file")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Flush landmarks to <output-dir>/checkpoint_<video> as extraction runs and resume from there after a crash")
+    parser.add_argument("--stride", type=int, default=1,
+                        help="Run the models on every k-th frame only and interpolate the landmarks in between")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Downscale factor for the frames given to the models, e.g. 0.5")
+    parser.add_argument("--roi", action="store_true",
+                        help="Crop the model input to the arm found on the previous frame")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count()
+    start_timestamp = args.start_timestamp
+    if start_timestamp is None:
+        start_timestamp = video_start_timestamp(args.video)
+    video_name = os.path.splitext(os.path.basename(args.video))[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    output_video_path = None
+    if not args.landmarks_only:
+        output_video_path = os.path.join(args.output_dir, "body_and_hand_output_" + os.path.basename(args.video))
+
+    checkpoint_dir = None
+    if args.checkpoint:
+        checkpoint_dir = os.path.join(args.output_dir, "checkpoint_" + video_name)
+
+    landmarks = extract_landmarks(
+        args.video,
+        start_timestamp,
+        output_video_path=output_video_path,
+        workers=workers,
+        checkpoint_dir=checkpoint_dir,
+        stride=args.stride,
+        scale=args.scale,
+        roi=args.roi,
+    )
+
+    # Save the landmarks as per-frame arrays, Step 03 reads the .npz file directly
+    landmarks_path = os.path.join(args.output_dir, "body_and_hand_landmarks_data_" + video_name)
+    landmarks.save(landmarks_path + ".npz")
+    if args.csv:
+        landmarks.to_dataframe().to_csv(landmarks_path + ".csv", index=False)
+    if checkpoint_dir:
+        clear_checkpoint(checkpoint_dir)
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,57 @@
 
+import argparse
+import os
 import pandas as pd
 import numpy as np
-
-# Specify your file path here
-file_path = "working_scirpts_for_dataset/wrist_angle_dataset/_output/body_and_hand_landmarks_data_TimeVideo_20230908_163442.csv"
-
-def calculate_angle(hand_landmarks, pose_landmarks):
-    # Extracting the required points
-    point_A = hand_landmarks.loc[hand_landmarks['landmark_id'] == 0, ['x', 'y', 'z']].values[0]
-    point_B = hand_landmarks.loc[hand_landmarks['landmark_id'] == 5, ['x', 'y', 'z']].values[0]
-    point_C = hand_landmarks.loc[hand_landmarks['landmark_id'] == 17, ['x', 'y', 'z']].values[0]
-    point_interest = pose_landmarks.loc[pose_landmarks['landmark_id'] == 14, ['x', 'y', 'z']].values[0]
-    
-    # Forming the vectors
-    vector_AB = point_B - point_A
-    vector_AC = point_C - point_A
-    vector_AP_interest = point_interest - point_A
-
-    # Normal vector of the plane formed by points A, B, C
-    normal_vector = np.cross(vector_AB, vector_AC)
-
-    # Projecting onto XY-plane
-    normal_vector_projected = [normal_vector[0], normal_vector[1], 0]
-    vector_AP_interest_projected = [vector_AP_interest[0], vector_AP_interest[1], 0]
-
-    # Calculating the angle between the projections
-    dot_product = np.dot(normal_vector_projected, vector_AP_interest_projected)
-    magnitude_product = np.linalg.norm(normal_vector_projected) * np.linalg.norm(vector_AP_interest_projected)
-    cos_theta = dot_product / magnitude_product
-    angle = np.arccos(cos_theta) * 180 / np.pi
-
-    return angle
-
-def process_file(file_path):
-    data_df = pd.read_csv(file_path)
-
-    # Grouping by timestamp and calculating the angle
-    unique_timestamps = data_df['global_timestamp_ms'].unique()
-    angle_data = []
-    ta_data = []
-
-    for timestamp in unique_timestamps:
-        timestamp_data = data_df[data_df['global_timestamp_ms'] == timestamp]
-        hand_landmarks = timestamp_data[timestamp_data['landmark_type'] == 'hand']
-        pose_landmarks = timestamp_data[timestamp_data['landmark_type'] == 'pose']
-
-        # Check if required landmarks are available
-        if all(landmark_id in hand_landmarks['landmark_id'].values for landmark_id in [0, 5, 17]) and            14 in pose_landmarks['landmark_id'].values:
-            angle = calculate_angle(hand_landmarks, pose_landmarks)
-        else:
-            angle = None
-
-        angle_data.extend([angle] * len(timestamp_data))
-        ta_data.append({"global_timestamp_ms": timestamp, "angle": angle if angle else ""})
+from landmark_arrays import LandmarkArrays
+from angle_calculation import REQUIRED_LANDMARKS, calculate_angles, frame_angles
+
+# Specify your file path here, either the .npz landmark arrays or the long format .csv from Step 02
+file_path = "working_scirpts_for_dataset/wrist_angle_dataset/_output/body_and_hand_landmarks_data_TimeVideo_20230908_163442.npz"
+
+def landmark_points(data_df, timestamps):
+    # Pivot the landmarks the angle needs into one (n, 3) array per point, first detection per frame wins
+    frames = pd.Index(timestamps)
+    first_detections = data_df.drop_duplicates(['global_timestamp_ms', 'landmark_type', 'landmark_id'])
+    points = {}
+    available = np.ones(len(frames), dtype=bool)
+    for name, (landmark_type, landmark_id) in REQUIRED_LANDMARKS.items():
+        rows = first_detections[(first_detections['landmark_type'] == landmark_type) & (first_detections['landmark_id'] == landmark_id)]
+        frame_rows = frames.get_indexer(rows['global_timestamp_ms'])
+        points[name] = np.full((len(frames), 3), np.nan)
+        points[name][frame_rows] = rows[['x', 'y', 'z']].to_numpy(dtype=float)
+        found = np.zeros(len(frames), dtype=bool)
+        found[frame_rows] = True
+        available &= found
+    return points, available
+
+def landmark_array_angles(landmarks):
+    angles = frame_angles(landmarks)
+    # Frames without any landmark never appeared in the long format table
+    detected = landmarks.hand_present | landmarks.pose_present
+    return landmarks.to_dataframe(), landmarks.global_timestamps[detected], angles[detected]
+
+def process_file(file_path, output_dir="working_scirpts_for_dataset/wrist_angle_dataset/_output"):
+    if file_path.endswith(".npz"):
+        data_df, unique_timestamps, angles = landmark_array_angles(LandmarkArrays.load(file_path))
+    else:
+        data_df = pd.read_csv(file_path)
+
+        # One angle per frame, computed for all frames at once
+        unique_timestamps = data_df['global_timestamp_ms'].unique()
+        points, available = landmark_points(data_df, unique_timestamps)
+        angles = calculate_angles(points["A"], points["B"], points["C"], points["interest"])
+        angles[~available] = np.nan
 
     # Adding the angle data as a new column
-    data_df['angle'] = angle_data
-    ta_df = pd.DataFrame(ta_data)
+    data_df['angle'] = angles[pd.Index(unique_timestamps).get_indexer(data_df['global_timestamp_ms'])]
+    # A zero angle was written as a blank in the TA file, keep it that way
+    ta_df = pd.DataFrame({"global_timestamp_ms": unique_timestamps, "angle": np.where(angles == 0, np.nan, angles)})
 
     # Saving the updated DataFrame to CSV files
-    updated_file_path = "working_scirpts_for_dataset/wrist_angle_dataset/_output/updated_" + file_path.split("/")[-1]
-    ta_file_path = "working_scirpts_for_dataset/wrist_angle_dataset/_output/TA_" + file_path.split("/")[-1]
+    output_name = os.path.splitext(file_path.split("/")[-1])[0] + ".csv"
+    updated_file_path = os.path.join(output_dir, "updated_" + output_name)
+    ta_file_path = os.path.join(output_dir, "TA_" + output_name)
     
     data_df.to_csv(updated_file_path, index=False)
     ta_df.to_csv(ta_file_path, index=False)
@@ -68,6 +59,13 @@ def process_file(file_path):
     print(f"Updated data saved to: {updated_file_path}")
     print(f"TA data saved to: {ta_file_path}")
 
-# Run the processing function
-process_file(file_path)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wrist angle per video frame from the Step 02 landmarks")
+    parser.add_argument("landmarks", nargs="?", default=file_path, help="Landmark .npz or long format .csv from Step 02")
+    parser.add_argument("--output-dir", default="working_scirpts_for_dataset/wrist_angle_dataset/_output",
+                        help="Folder the updated_ and TA_ files are written to")
+    args = parser.parse_args()
+
+    # Run the processing function
+    process_file(args.landmarks, args.output_dir)
 
@@ -1,6 +1,7 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import argparse
+from emg_recording import open_recording
 
 def plot_data(dataset, filepath):
     # Extract the filename from the path and use it as the title
@@ -40,11 +41,20 @@ def plot_data(dataset, filepath):
     plt.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Plot EMG values and angle over time")
+    parser.add_argument("--start", type=float, default=None, help="Window start, seconds after the first sample")
+    parser.add_argument("--end", type=float, default=None, help="Window end, seconds after the first sample")
+    args = parser.parse_args()
+
     # Define the paths to your CSV files here
     csv_paths = [
 "working_scirpts_for_dataset/wrist_angle_dataset/_output/official EMG mediapipe 10 minute - interpolation.csv", "working_scirpts_for_dataset/wrist_angle_dataset/_output/official EMG mediapipe 10 minute - no NaN.csv"]
     for path in csv_paths:
-        data = pd.read_csv(path)
+        # Memory-mapped, so only the plotted window is read from disk
+        recording = open_recording(path)
+        t0 = None if args.start is None else recording.start_time + args.start
+        t1 = None if args.end is None else recording.start_time + args.end
+        data = recording.to_dataframe(t0, t1)
         plot_data(data, path)
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+def nearest_indices(reference_times, query_times, tolerance: float = None) -> np.ndarray:
+    """Positional index of the nearest reference time for every query time, -1 where there is none
+
+    Matches abs(reference_times - t).idxmin(): ties go to the earlier row and NaN reference times are ignored.
+    """
+    reference_times = np.asarray(reference_times, dtype=float)
+    query_times = np.asarray(query_times, dtype=float)
+    result = np.full(len(query_times), -1, dtype=np.int64)
+
+    rows = np.flatnonzero(~np.isnan(reference_times))
+    if len(rows) == 0:
+        return result
+    # Stable sort, so a run of equal times keeps its original row order
+    order = rows[np.argsort(reference_times[rows], kind='stable')]
+    times = reference_times[order]
+
+    valid = ~np.isnan(query_times)
+    queries = query_times[valid]
+    right = np.searchsorted(times, queries, side='left')
+    left = np.clip(right - 1, 0, len(times) - 1)
+    right = np.clip(right, 0, len(times) - 1)
+    left_diff = np.abs(times[left] - queries)
+    right_diff = np.abs(times[right] - queries)
+
+    # Equal times are interchangeable by value, idxmin returns the first row of the run
+    left_row = order[np.searchsorted(times, times[left], side='left')]
+    right_row = order[np.searchsorted(times, times[right], side='left')]
+    take_left = (left_diff < right_diff) | ((left_diff == right_diff) & (left_row <= right_row))
+    nearest = np.where(take_left, left_row, right_row)
+    if tolerance is not None:
+        nearest[np.minimum(left_diff, right_diff) > tolerance] = -1
+    result[valid] = nearest
+    return result
+
+def nearest_join(target_df: pd.DataFrame, target_time: str, source_df: pd.DataFrame, source_time: str,
+                 columns: list, tolerance: float = None) -> pd.DataFrame:
+    """Values of source_df[columns] at the source row nearest in time to every target row, NaN beyond tolerance"""
+    indices = nearest_indices(source_df[source_time], target_df[target_time], tolerance)
+    joined = source_df[columns].iloc[np.maximum(indices, 0)].reset_index(drop=True)
+    joined.index = target_df.index
+    if (indices < 0).any():
+        joined = joined.astype({column: float for column in columns if not pd.api.types.is_float_dtype(joined[column])})
+        joined.loc[indices < 0] = np.nan
+    return joined
+
+def find_nearest_angles(emg_df: pd.DataFrame, arm_angle_df: pd.DataFrame, emg_time: str = 'global_time',
+                        angle_time: str = 'global_timestamp_ms', tolerance: float = None) -> pd.Series:
+    """Angle of the video frame closest to every EMG sample, the vectorised form of find_nearest_angle"""
+    return nearest_join(emg_df, emg_time, arm_angle_df, angle_time, ['angle'], tolerance)['angle']
@@ -0,0 +1,41 @@
+import numpy as np
+
+REQUIRED_LANDMARKS = {"A": ("hand", 0), "B": ("hand", 5), "C": ("hand", 17), "interest": ("pose", 14)}
+
+def row_dot(a, b):
+    # Row by row dot product, matmul rounds the same way as np.dot on a single frame
+    return np.matmul(a[:, np.newaxis, :], b[:, :, np.newaxis])[:, 0, 0]
+
+def calculate_angles(point_A, point_B, point_C, point_interest):
+    # Every argument is an (n, 3) array with one row per frame
+    # Forming the vectors
+    vector_AB = point_B - point_A
+    vector_AC = point_C - point_A
+    vector_AP_interest = point_interest - point_A
+
+    # Normal vector of the plane formed by points A, B, C
+    normal_vector = np.cross(vector_AB, vector_AC)
+
+    # Projecting onto XY-plane
+    normal_vector_projected = normal_vector.copy()
+    normal_vector_projected[:, 2] = 0
+    vector_AP_interest_projected = vector_AP_interest.copy()
+    vector_AP_interest_projected[:, 2] = 0
+
+    # Calculating the angle between the projections
+    dot_product = row_dot(normal_vector_projected, vector_AP_interest_projected)
+    magnitude_product = np.sqrt(row_dot(normal_vector_projected, normal_vector_projected)) * np.sqrt(row_dot(vector_AP_interest_projected, vector_AP_interest_projected))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_theta = dot_product / magnitude_product
+        angle = np.arccos(cos_theta) * 180 / np.pi
+
+    return angle
+
+def frame_angles(landmarks):
+    """Wrist angle for every frame of a LandmarkArrays, NaN where the hand or the pose was not detected"""
+    # Per-frame arrays already hold landmark 0/5/17 of the hand and 14 of the pose in fixed slots
+    points = {name: getattr(landmarks, landmark_type)[:, landmark_id].astype(float)
+              for name, (landmark_type, landmark_id) in REQUIRED_LANDMARKS.items()}
+    angles = calculate_angles(points["A"], points["B"], points["C"], points["interest"])
+    angles[~(landmarks.hand_present & landmarks.pose_present)] = np.nan
+    return angles
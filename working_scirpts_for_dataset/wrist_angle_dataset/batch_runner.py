@@ -0,0 +1,206 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pipeline_cache import PipelineCache, DEFAULT_CACHE_DIR
+from video_metadata import video_start_timestamp
+
+# Runs Steps 02 - 04 for every session in a manifest, for example
+# {
+#     "output_dir": "working_scirpts_for_dataset/wrist_angle_dataset/_output/batch",
+#     "step02_args": ["--landmarks-only"],
+#     "sessions": [
+#         {"video": "working_scirpts_for_dataset/wrist_angle_dataset/__input/TimeVideo_20230908_163442.mp4",
+#          "emg": "working_scirpts_for_dataset/wrist_angle_dataset/__input/official mediapipe 10min fixed.csv"}
+#     ]
+# }
+# The video start time comes from video_metadata.KNOWN_START_TIMES, else the TimeVideo_YYYYMMDD_HHMMSS file name
+# or the container metadata, which only give whole seconds. A session
+# can override it with "start_time" ("2023-09-08 16:34:42.565") or "start_timestamp" (unix seconds), and can
+# give a "name" for its output folder (the video name by default) and its own "step02_args".
+# "cache_dir" moves the step output cache.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STEP_SCRIPTS = {
+    "step02": "Step 02 - mediapipe_hand+body+angle 001.py",
+    "step03": "Step 03 - hand+body_to_angle_001.py",
+    "step04a": "Step 04a - complete_script_with_dropna.py",
+    "step04b": "Step 04b - complete_script_with_interpolation.py",
+}
+# Modules each step runs, part of the step's cache key next to the step script
+STEP_MODULES = {
+    "step02": ["landmark_extraction.py", "landmark_arrays.py", "frame_source.py", "landmark_rendering.py"],
+    "step03": ["landmark_arrays.py", "angle_calculation.py"],
+    "step04a": ["emg_recording.py", "alignment.py"],
+    "step04b": ["emg_recording.py", "alignment.py"],
+}
+DEFAULT_WORKERS = 2  # Sessions processed at once, Step 02 is heavy so keep this below the core count
+TIMING_FILE = "batch_timing.csv"
+TIMING_COLUMNS = ["run", "session", "step", "status", "seconds", "returncode", "log"]
+
+class Step:
+    def __init__(self, session: str, name: str, args: list, inputs: list, outputs: list, deps: list = (),
+                 params: dict = None) -> None:
+        self.session = session
+        self.name = name
+        self.script = os.path.join(SCRIPT_DIR, STEP_SCRIPTS[name])
+        self.args = args
+        # The step code counts as an input, editing it reruns the step
+        self.inputs = [self.script] + [os.path.join(SCRIPT_DIR, module) for module in STEP_MODULES[name]] + inputs
+        self.outputs = outputs
+        self.deps = list(deps)
+        # Settings that change the outputs, output paths are left out so sessions moved elsewhere still hit the cache
+        self.params = params or {}
+
+    def up_to_date(self) -> bool:
+        if not all(os.path.exists(path) for path in self.outputs):
+            return False
+        newest_input = max(os.path.getmtime(path) for path in self.inputs if os.path.exists(path))
+        return min(os.path.getmtime(path) for path in self.outputs) >= newest_input
+
+def session_start_timestamp(session: dict) -> float:
+    if "start_timestamp" in session:
+        return float(session["start_timestamp"])
+    if "start_time" in session:
+        return datetime.datetime.strptime(session["start_time"], "%Y-%m-%d %H:%M:%S.%f").timestamp()
+    return video_start_timestamp(session["video"])
+
+def session_steps(session: dict, output_dir: str, step02_args: list) -> list:
+    """Step 02 -> Step 03 -> Step 04a and 04b for one session, every file in the session's own output folder"""
+    video_name = os.path.splitext(os.path.basename(session["video"]))[0]
+    name = session.get("name", video_name)
+    folder = os.path.join(output_dir, name)
+    landmarks = os.path.join(folder, "body_and_hand_landmarks_data_" + video_name + ".npz")
+    angles = os.path.join(folder, "TA_body_and_hand_landmarks_data_" + video_name + ".csv")
+    updated = os.path.join(folder, "updated_body_and_hand_landmarks_data_" + video_name + ".csv")
+    merged_dropna = os.path.join(folder, "merged_dataset_version_2_dropna.csv")
+    merged_interpolated = os.path.join(folder, "merged_dataset_version_2_corrected.csv")
+
+    start_timestamp = session_start_timestamp(session)
+    extra_args = session.get("step02_args", step02_args)
+    step02_outputs = [landmarks]
+    if "--landmarks-only" not in extra_args:
+        step02_outputs.append(os.path.join(folder, "body_and_hand_output_" + os.path.basename(session["video"])))
+    if "--csv" in extra_args:
+        step02_outputs.append(landmarks[:-len(".npz")] + ".csv")
+    step02 = Step(name, "step02",
+                  ["--video", session["video"], "--start-timestamp", repr(start_timestamp), "--output-dir", folder] + extra_args,
+                  [session["video"]], step02_outputs, params={"start_timestamp": start_timestamp, "args": extra_args})
+    step03 = Step(name, "step03", [landmarks, "--output-dir", folder], [landmarks], [angles, updated], [step02])
+    step04a = Step(name, "step04a", ["--angles", angles, "--emg", session["emg"], "--output", merged_dropna],
+                   [angles, session["emg"]], [merged_dropna], [step03])
+    step04b = Step(name, "step04b", ["--angles", angles, "--emg", session["emg"], "--output", merged_interpolated],
+                   [angles, session["emg"]], [merged_interpolated], [step03])
+    return [step02, step03, step04a, step04b]
+
+def run_step(step: Step, log_dir: str, force: bool, cache: PipelineCache = None) -> dict:
+    result = {"session": step.session, "step": step.name, "seconds": 0.0, "returncode": "", "log": ""}
+    # Checked only once the dependencies have finished, a rerun upstream makes this step out of date
+    if cache is not None:
+        key = cache.key(step.name, step.inputs, step.params)
+        if not force and cache.restore(key, step.outputs):
+            return dict(result, status="cached")
+    elif not force and step.up_to_date():
+        return dict(result, status="up to date")
+
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, step.name + ".log")
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        completed = subprocess.run([sys.executable, step.script] + step.args, stdout=log, stderr=subprocess.STDOUT)
+        status = "ran" if completed.returncode == 0 else "failed"
+        missing = [path for path in step.outputs if not os.path.exists(path)]
+        if status == "ran" and missing:
+            # Exited cleanly without doing its job, nothing downstream can run on it
+            log.write(f"\nbatch_runner: step exited 0 but did not write {', '.join(missing)}\n")
+            status = "failed"
+        if status == "ran" and cache is not None:
+            try:
+                cache.store(key, step.outputs, step.name, step.params)
+            except OSError as e:
+                # The outputs are in place, only the cache entry is lost
+                log.write(f"\nbatch_runner: could not cache the outputs: {e}\n")
+    return dict(result, status=status, seconds=round(time.perf_counter() - started, 3),
+                returncode=completed.returncode, log=log_path)
+
+def run_steps(steps: list, output_dir: str, workers: int, force: bool = False, cache: PipelineCache = None) -> list:
+    """Run every step once its dependencies are done, up to `workers` at a time, and return one result per step"""
+    results = {}
+    pending = list(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for step in list(pending):
+                dep_results = [results.get(id(dep)) for dep in step.deps]
+                if any(result is not None and result["status"] in ("failed", "blocked") for result in dep_results):
+                    # Nothing to run on, an earlier step of the session failed
+                    results[id(step)] = {"session": step.session, "step": step.name, "status": "blocked",
+                                         "seconds": 0.0, "returncode": "", "log": ""}
+                    pending.remove(step)
+                elif all(result is not None for result in dep_results):
+                    pending.remove(step)
+                    log_dir = os.path.join(output_dir, step.session, "logs")
+                    running[executor.submit(run_step, step, log_dir, force, cache)] = step
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    results[id(step)] = future.result()
+                except Exception as e:
+                    # One broken step must not stop the other sessions or lose the timing of the batch
+                    print(f"{step.session} {step.name} could not be run: {e!r}")
+                    results[id(step)] = {"session": step.session, "step": step.name, "status": "failed",
+                                         "seconds": 0.0, "returncode": "", "log": str(e)}
+                print(f"{step.session} {step.name}: {results[id(step)]['status']} ({results[id(step)]['seconds']:.1f} s)")
+    return [results[id(step)] for step in steps]
+
+def save_timing(results: list, output_dir: str, run: str) -> str:
+    # Appended, so the file keeps the timing of every batch run
+    timing_path = os.path.join(output_dir, TIMING_FILE)
+    new_file = not os.path.exists(timing_path)
+    with open(timing_path, "a", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=TIMING_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        for result in results:
+            writer.writerow(dict(result, run=run))
+    return timing_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Steps 02 - 04 for every session in a manifest")
+    parser.add_argument("manifest", help="JSON session manifest")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Steps run at the same time")
+    parser.add_argument("--force", action="store_true", help="Rerun steps whose outputs are up to date")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Only skip steps by file modification time, without the content hash cache")
+    args = parser.parse_args()
+
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+    output_dir = manifest.get("output_dir", "working_scirpts_for_dataset/wrist_angle_dataset/_output/batch")
+    os.makedirs(output_dir, exist_ok=True)
+
+    steps = []
+    for session in manifest["sessions"]:
+        steps += session_steps(session, output_dir, manifest.get("step02_args", []))
+
+    cache = None if args.no_cache else PipelineCache(manifest.get("cache_dir", DEFAULT_CACHE_DIR))
+    run = datetime.datetime.now().isoformat(timespec="seconds")
+    results = run_steps(steps, output_dir, args.workers, args.force, cache)
+    timing_path = save_timing(results, output_dir, run)
+
+    failed = [result for result in results if result["status"] == "failed"]
+    for result in failed:
+        print(f"{result['session']} {result['step']} failed, see {result['log']}")
+    print(f"Step timing saved to: {timing_path}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
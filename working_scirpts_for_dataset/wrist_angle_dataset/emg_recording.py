@@ -0,0 +1,296 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import ExitStack
+from threading import Thread
+from queue import Queue, Empty, Full
+import numpy as np
+import pandas as pd
+
+RECORD_CHUNK_SIZE = 1000  # Rows collected before they are written to disk
+RECORD_FLUSH_INTERVAL = 1.0  # Longest time rows wait in memory before they are written (s)
+RECORD_QUEUE_SIZE = 256  # Most write() calls waiting for the writer thread, write() blocks beyond that
+
+# Binary recordings are a headerless file (.emg) holding every column as one contiguous block of little endian
+# values, next to a JSON metadata file (.json) with the column names, their dtypes, the byte offset of each
+# column block, the row count, sensor_placement_dict and the sample rate
+BINARY_EXTENSION = '.emg'
+COLUMN_ALIGNMENT = 8  # Column blocks start on a multiple of this many bytes, so every column maps aligned
+METADATA_EXTENSION = '.json'
+RECORDING_EXTENSIONS = ('.csv', BINARY_EXTENSION)
+
+def metadata_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + METADATA_EXTENSION
+
+def in_progress_path(directory: str, extension: str) -> str:
+    # Where a recording streams to before its title is known, close(file_path=...) moves it into place
+    return os.path.join(directory, f'.in_progress_{time.strftime("%Y%m%d_%H%M%S")}_{os.getpid()}{extension}')
+
+def column_dtypes(dtypes: list) -> list:
+    return [np.dtype(dtype).newbyteorder('<') for dtype in dtypes]
+
+class StreamingRecorder:
+    """Appends recorded rows to a CSV or binary (.emg) file from a background thread, so memory stays flat while recording
+
+    If the writer thread fails it logs the error and stops, write() drops rows from then on and close() raises it.
+    """
+    def __init__(self, file_path: str, columns: list, dtypes: list = None, metadata: dict = None,
+                 chunk_size: int = RECORD_CHUNK_SIZE, flush_interval: float = RECORD_FLUSH_INTERVAL) -> None:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self.file_path = file_path
+        self.columns = list(columns)
+        self.binary = file_path.endswith(BINARY_EXTENSION)
+        if self.binary:
+            if dtypes is None or len(dtypes) != len(self.columns):
+                raise ValueError(f"Binary recordings need one dtype per column, got {dtypes} for {self.columns}")
+            self.dtypes = column_dtypes(dtypes)
+        self.metadata = dict(metadata or {})
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.row_queue = Queue(maxsize=RECORD_QUEUE_SIZE)
+        self.rows_written = 0
+        self.start_time = time.time()
+        self.stop_time = None
+        self.final_path = None  # Set by close, where the finished recording is moved to
+        self.discard = False
+        self.error = None  # Exception that stopped the writer thread
+        self.thread = Thread(target=self.run)
+        self.thread.start()
+
+    def write(self, rows) -> None:
+        # rows is a list of rows or an (n, len(columns)) array
+        if len(rows):
+            self.put(rows)
+
+    def put(self, item) -> None:
+        # Waits while the queue is full, unless the writer thread has stopped and will never empty it
+        while self.error is None:
+            try:
+                self.row_queue.put(item, timeout=self.flush_interval)
+                return
+            except Full:
+                pass
+
+    def close(self, wait: bool = False, file_path: str = None, discard: bool = False) -> None:
+        # Returns straight away unless wait is set, the writer thread finishes whatever is still queued.
+        # file_path renames the recording once it is complete, discard deletes it instead.
+        # Raises the writer thread's error, unless the recording is discarded anyway
+        self.stop_time = time.time()
+        self.final_path = file_path
+        self.discard = discard
+        self.put(None)
+        if wait and self.thread.is_alive():
+            self.thread.join()
+        if self.error is not None and not discard:
+            raise RuntimeError(f"Recording to {self.file_path} failed: {self.error}") from self.error
+
+    def run(self) -> None:
+        try:
+            self.write_rows()
+        except Exception as e:
+            self.error = e
+            logging.error(f"Recording to {self.file_path} failed", exc_info=True)
+
+    def part_paths(self) -> list:
+        # While recording, each column of a binary recording streams to its own file
+        return [f'{self.file_path}.{i}.part' for i in range(len(self.columns))]
+
+    def write_rows(self) -> None:
+        with ExitStack() as stack:
+            if self.binary:
+                writer = None
+                files = [stack.enter_context(open(path, 'wb')) for path in self.part_paths()]
+            else:
+                files = [stack.enter_context(open(self.file_path, 'w', newline=''))]
+                writer = csv.writer(files[0])
+                writer.writerow(self.columns)
+            chunk = []
+            last_write = time.perf_counter()
+            while True:
+                try:
+                    rows = self.row_queue.get(timeout=self.flush_interval)
+                except Empty:
+                    rows = []
+                if rows is None:
+                    break
+                chunk.extend(rows)
+                if len(chunk) >= self.chunk_size or time.perf_counter() - last_write >= self.flush_interval:
+                    self.write_chunk(writer, files, chunk)
+                    chunk = []
+                    last_write = time.perf_counter()
+            self.write_chunk(writer, files, chunk)
+        if self.binary and not self.discard:
+            self.join_columns()
+        self.finish_file()
+
+    def join_columns(self) -> None:
+        # Copies the column files into the .emg one after another, so reading a column is one contiguous read
+        offsets = []
+        with open(self.file_path, 'wb') as file:
+            for path in self.part_paths():
+                file.write(bytes(-file.tell() % COLUMN_ALIGNMENT))
+                offsets.append(file.tell())
+                with open(path, 'rb') as part:
+                    shutil.copyfileobj(part, file)
+        for path in self.part_paths():
+            os.remove(path)
+        self.write_metadata(offsets)
+
+    def finish_file(self) -> None:
+        paths = [self.file_path, metadata_path(self.file_path)] if self.binary else [self.file_path]
+        if self.discard:
+            for path in self.part_paths() if self.binary else paths:
+                os.remove(path)
+        elif self.final_path is not None and self.final_path != self.file_path:
+            os.makedirs(os.path.dirname(self.final_path) or '.', exist_ok=True)
+            final_paths = [self.final_path, metadata_path(self.final_path)] if self.binary else [self.final_path]
+            for path, final_path in zip(paths, final_paths):
+                os.replace(path, final_path)
+            self.file_path = self.final_path
+
+    def write_chunk(self, writer, files: list, chunk: list) -> None:
+        if not chunk:
+            return
+        if self.binary:
+            values = np.asarray(chunk, dtype=float)
+            for i, (dtype, file) in enumerate(zip(self.dtypes, files)):
+                values[:, i].astype(dtype).tofile(file)
+        else:
+            writer.writerows(chunk)
+        for file in files:
+            file.flush()
+        self.rows_written += len(chunk)
+
+    def write_metadata(self, offsets: list) -> None:
+        metadata = dict(self.metadata)
+        metadata['columns'] = self.columns
+        metadata['dtypes'] = [dtype.str for dtype in self.dtypes]
+        metadata['offsets'] = offsets
+        metadata['rows'] = self.rows_written
+        metadata['start_time'] = self.start_time
+        if self.stop_time is not None and self.stop_time > self.start_time:
+            metadata['sample_rate'] = self.rows_written / (self.stop_time - self.start_time)
+        with open(metadata_path(self.file_path), 'w') as file:
+            json.dump(metadata, file, indent=4)
+
+def read_metadata(file_path: str) -> dict:
+    with open(metadata_path(file_path)) as file:
+        return json.load(file)
+
+def load_recording(file_path: str) -> pd.DataFrame:
+    """Load a CSV or binary (.emg) recording into a DataFrame with the recorded column names"""
+    if not file_path.endswith(BINARY_EXTENSION):
+        return pd.read_csv(file_path)
+    metadata = read_metadata(file_path)
+    return pd.DataFrame({column: np.fromfile(file_path, dtype=dtype, count=metadata['rows'], offset=offset)
+                         for column, dtype, offset in zip(metadata['columns'], metadata['dtypes'], metadata['offsets'])})
+
+class RecordingReader:
+    """Memory-mapped binary (.emg) recording, reader[column] and reader[t0:t1] are views into the file, not copies
+
+    reader[column] is the whole column as one contiguous array, reader[t0:t1] a {column: array} dict of a time range.
+    """
+    def __init__(self, file_path: str, time_column: str = None) -> None:
+        self.file_path = file_path
+        self.metadata = read_metadata(file_path)
+        self.columns = self.metadata['columns']
+        self.rows = self.metadata['rows']
+        # One map of the whole file, every column is a slice of it
+        data = np.memmap(file_path, dtype=np.uint8, mode='r') if os.path.getsize(file_path) else np.empty(0, dtype=np.uint8)
+        self.data = {}
+        for column, dtype, offset in zip(self.columns, column_dtypes(self.metadata['dtypes']), self.metadata['offsets']):
+            self.data[column] = data[offset:offset + self.rows * dtype.itemsize].view(dtype)
+        # global_time is seconds since the epoch, the Arduino timestamp wraps after about 70 minutes
+        self.time_column = time_column or ('global_time' if 'global_time' in self.columns else self.columns[0])
+        self.time = self.data[self.time_column]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError("Time slices do not support a step, use iter_windows instead")
+            start, stop = self.index(key.start, 0), self.index(key.stop, len(self))
+            return {column: values[start:stop] for column, values in self.data.items()}
+        raise TypeError(f"Recordings are indexed by column name or time slice, got {key!r}")
+
+    def index(self, t: float, default: int) -> int:
+        # Time column is sorted, so the first row at or after t is a binary search away
+        return default if t is None else int(np.searchsorted(self.time, t, side='left'))
+
+    @property
+    def start_time(self) -> float:
+        return float(self.time[0]) if len(self) else None
+
+    @property
+    def end_time(self) -> float:
+        return float(self.time[-1]) if len(self) else None
+
+    def channel(self, column: str, t0: float = None, t1: float = None) -> np.ndarray:
+        return self.data[column][self.index(t0, 0):self.index(t1, len(self))]
+
+    def iter_windows(self, window: float, step: float = None, t0: float = None, t1: float = None):
+        """Yield (start time, {column: values}) for consecutive windows without loading the whole recording"""
+        step = step or window
+        t = self.start_time if t0 is None else t0
+        end = self.end_time if t1 is None else t1
+        while t is not None and t <= end:
+            # The last window runs to t1, or to the end of the recording when no t1 is given
+            yield t, self[t:t + window if t + window < end else t1]
+            t += step
+
+    def to_dataframe(self, t0: float = None, t1: float = None) -> pd.DataFrame:
+        # Only the requested window is copied into memory
+        return pd.DataFrame({column: np.array(values) for column, values in self[t0:t1].items()})
+
+def import_csv(csv_path: str, file_path: str = None, dtypes: list = None, metadata: dict = None,
+               chunk_size: int = 100000) -> str:
+    """Convert a CSV recording to .emg in chunks, so existing recordings can be memory-mapped"""
+    if file_path is None:
+        file_path = os.path.splitext(csv_path)[0] + BINARY_EXTENSION
+    recorder = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        if recorder is None:
+            non_numeric = [column for column in chunk.columns if not pd.api.types.is_numeric_dtype(chunk[column])]
+            if non_numeric:
+                raise ValueError(f"Cannot store non-numeric columns {non_numeric} of {csv_path} in a binary recording")
+            recorder = StreamingRecorder(file_path, list(chunk.columns), dtypes or ['f8'] * len(chunk.columns),
+                                         metadata, chunk_size=chunk_size)
+        recorder.write(chunk.to_numpy(dtype=float))
+    if recorder is None:
+        raise ValueError(f"{csv_path} has no rows to import")
+    recorder.close(wait=True)
+    return file_path
+
+def open_recording(file_path: str, time_column: str = None) -> RecordingReader:
+    """Memory-map a recording, CSV recordings are converted to .emg once and the binary copy is reused"""
+    if not file_path.endswith(BINARY_EXTENSION):
+        binary_path = os.path.splitext(file_path)[0] + BINARY_EXTENSION
+        if not (os.path.exists(binary_path) and os.path.getmtime(binary_path) >= os.path.getmtime(file_path)):
+            import_csv(file_path, binary_path)
+        file_path = binary_path
+    return RecordingReader(file_path, time_column)
+
+def list_recordings(data_dir: str) -> list:
+    return sorted(f for f in os.listdir(data_dir) if f.endswith(RECORDING_EXTENSIONS))
+
+def export_csv(file_path: str, csv_path: str = None) -> str:
+    """Write a binary recording out as CSV, next to the original unless csv_path is given"""
+    if csv_path is None:
+        csv_path = os.path.splitext(file_path)[0] + '.csv'
+    load_recording(file_path).to_csv(csv_path, index=False)
+    return csv_path
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export binary (.emg) recordings to CSV")
+    parser.add_argument("recordings", nargs="+", help="Paths to .emg recordings")
+    args = parser.parse_args()
+    for recording in args.recordings:
+        print(f"Exported {recording} to {export_csv(recording)}")
@@ -0,0 +1,80 @@
+from threading import Thread, Event
+from queue import Queue, Full
+import cv2
+
+PREFETCH_FRAMES = 8  # Decoded frames buffered ahead of inference, bounds memory to a handful of frames
+PUT_TIMEOUT = 0.1  # How often a blocked decode thread checks whether the consumer has gone away (s)
+
+class FrameSource:
+    """Iterates over (frame_idx, frame, rgb_frame) while a background thread decodes the next frames
+
+    rgb_frame is None unless rgb=True, the BGR to RGB conversion then also happens on the decode thread.
+    """
+    def __init__(self, video_path: str, start_frame: int = 0, stop_frame: int = None, rgb: bool = True,
+                 prefetch: int = PREFETCH_FRAMES) -> None:
+        self.video_path = video_path
+        self.start_frame = start_frame
+        self.stop_frame = stop_frame
+        self.rgb = rgb
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"Error opening video file {video_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        self.frame_queue = Queue(maxsize=prefetch)
+        self.stop_event = Event()
+        self.thread = Thread(target=self.decode_frames, daemon=True)
+        self.thread.start()
+
+    def decode_frames(self) -> None:
+        frame_idx = self.start_frame
+        try:
+            while self.stop_frame is None or frame_idx < self.stop_frame:
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if self.rgb else None
+                if not self.put((frame_idx, frame, rgb_frame)):
+                    return
+                frame_idx += 1
+            self.put(None)
+        except Exception as e:
+            # Re-raised on the consumer side
+            self.put(e)
+        finally:
+            self.cap.release()
+
+    def put(self, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.frame_queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self.frame_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def __enter__(self) -> "FrameSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+HAND_LANDMARKS = 21
+POSE_LANDMARKS = 33
+LANDMARK_COLUMNS = [
+    "landmark_type",
+    "global_timestamp_ms",
+    "video_timestamp_ms",
+    "landmark_id",
+    "x",
+    "y",
+    "z",
+]
+
+def result_points(hand_results, pose_results):
+    # (21, 3) hand and (33, 3) pose arrays from MediaPipe results, None where nothing was detected
+    hand = pose = None
+    if hand_results.multi_hand_landmarks:
+        hand = np.array([(lm.x, lm.y, lm.z) for lm in hand_results.multi_hand_landmarks[0].landmark], dtype=np.float32)
+    if pose_results.pose_landmarks:
+        pose = np.array([(lm.x, lm.y, lm.z) for lm in pose_results.pose_landmarks.landmark], dtype=np.float32)
+    return hand, pose
+
+class LandmarkArrays:
+    """Hand (frames, 21, 3) and pose (frames, 33, 3) float32 landmarks for consecutive frames, with presence masks
+
+    MediaPipe landmarks are float32 already, so nothing is lost compared to the long CSV format.
+    Only the first detected hand is kept, Step 02 runs Hands with max_num_hands=1.
+    """
+    def __init__(self, fps: float, start_timestamp: float, first_frame: int = 0, capacity: int = 0) -> None:
+        self.fps = fps
+        self.start_timestamp = start_timestamp
+        self.first_frame = first_frame
+        self.frames = 0
+        capacity = max(capacity, 1)
+        self.hand = np.full((capacity, HAND_LANDMARKS, 3), np.nan, dtype=np.float32)
+        self.pose = np.full((capacity, POSE_LANDMARKS, 3), np.nan, dtype=np.float32)
+        self.hand_present = np.zeros(capacity, dtype=bool)
+        self.pose_present = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def add(self, hand_results, pose_results) -> None:
+        self.add_points(*result_points(hand_results, pose_results))
+
+    def add_points(self, hand, pose) -> None:
+        if self.frames == len(self.hand):
+            self.grow(2 * len(self.hand))
+        i = self.frames
+        if hand is not None:
+            self.hand[i] = hand
+            self.hand_present[i] = True
+        if pose is not None:
+            self.pose[i] = pose
+            self.pose_present[i] = True
+        self.frames += 1
+
+    def skip(self) -> None:
+        # A frame that was not run through the models, left empty until interpolate fills it
+        self.add_points(None, None)
+
+    def grow(self, capacity: int) -> None:
+        extra = capacity - len(self.hand)
+        self.hand = np.concatenate((self.hand, np.full((extra, HAND_LANDMARKS, 3), np.nan, dtype=np.float32)))
+        self.pose = np.concatenate((self.pose, np.full((extra, POSE_LANDMARKS, 3), np.nan, dtype=np.float32)))
+        self.hand_present = np.concatenate((self.hand_present, np.zeros(extra, dtype=bool)))
+        self.pose_present = np.concatenate((self.pose_present, np.zeros(extra, dtype=bool)))
+
+    def trim(self) -> None:
+        self.hand = self.hand[:self.frames]
+        self.pose = self.pose[:self.frames]
+        self.hand_present = self.hand_present[:self.frames]
+        self.pose_present = self.pose_present[:self.frames]
+
+    def slice(self, start: int, stop: int) -> "LandmarkArrays":
+        # Frames [start, stop) counted from first_frame, as a copy
+        part = LandmarkArrays(self.fps, self.start_timestamp, self.first_frame + start)
+        part.hand = self.hand[start:stop].copy()
+        part.pose = self.pose[start:stop].copy()
+        part.hand_present = self.hand_present[start:stop].copy()
+        part.pose_present = self.pose_present[start:stop].copy()
+        part.frames = len(part.hand)
+        return part
+
+    def interpolate(self, stride: int) -> None:
+        """Fill the frames between every stride-th frame linearly from the processed frames either side
+
+        A skipped frame stays empty unless the landmarks were found on both neighbouring processed frames.
+        """
+        if stride <= 1:
+            return
+        self.trim()
+        frames = self.frame_indices
+        skipped = np.flatnonzero(frames % stride != 0)
+        offset = frames[skipped] % stride
+        before = skipped - offset
+        after = before + stride
+        inside = (before >= 0) & (after < self.frames)
+        skipped, offset, before, after = skipped[inside], offset[inside], before[inside], after[inside]
+        weight = (offset / stride).astype(np.float32)[:, np.newaxis, np.newaxis]
+        for points, present in ((self.hand, self.hand_present), (self.pose, self.pose_present)):
+            fill = present[before] & present[after]
+            rows, start, end = skipped[fill], points[before[fill]], points[after[fill]]
+            points[rows] = start + weight[fill] * (end - start)
+            present[rows] = True
+
+    @property
+    def frame_indices(self) -> np.ndarray:
+        return np.arange(self.first_frame, self.first_frame + self.frames)
+
+    @property
+    def global_timestamps(self) -> np.ndarray:
+        return self.start_timestamp + self.frame_indices / self.fps
+
+    @property
+    def video_timestamps_ms(self) -> np.ndarray:
+        return self.frame_indices / self.fps * 1000
+
+    @classmethod
+    def concatenate(cls, parts: list) -> "LandmarkArrays":
+        # Parts must cover consecutive frame ranges, in order
+        merged = cls(parts[0].fps, parts[0].start_timestamp, parts[0].first_frame)
+        for part in parts:
+            part.trim()
+        merged.hand = np.concatenate([part.hand for part in parts])
+        merged.pose = np.concatenate([part.pose for part in parts])
+        merged.hand_present = np.concatenate([part.hand_present for part in parts])
+        merged.pose_present = np.concatenate([part.pose_present for part in parts])
+        merged.frames = len(merged.hand)
+        return merged
+
+    def save(self, file_path: str) -> None:
+        self.trim()
+        np.savez_compressed(
+            file_path,
+            hand=self.hand,
+            pose=self.pose,
+            hand_present=self.hand_present,
+            pose_present=self.pose_present,
+            fps=self.fps,
+            start_timestamp=self.start_timestamp,
+            first_frame=self.first_frame,
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> "LandmarkArrays":
+        with np.load(file_path) as data:
+            landmarks = cls(float(data["fps"]), float(data["start_timestamp"]), int(data["first_frame"]))
+            landmarks.hand = data["hand"]
+            landmarks.pose = data["pose"]
+            landmarks.hand_present = data["hand_present"]
+            landmarks.pose_present = data["pose_present"]
+        landmarks.frames = len(landmarks.hand)
+        return landmarks
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Long format table, row for row the same as the landmark CSV Step 02 used to write"""
+        self.trim()
+        blocks = []
+        for type_order, (landmark_type, points, present) in enumerate((("hand", self.hand, self.hand_present),
+                                                                        ("pose", self.pose, self.pose_present))):
+            frames = np.flatnonzero(present)
+            count = points.shape[1]
+            blocks.append(pd.DataFrame({
+                "frame": np.repeat(frames, count),
+                "type_order": type_order,
+                "landmark_type": landmark_type,
+                "landmark_id": np.tile(np.arange(count), len(frames)),
+                "x": points[frames, :, 0].astype(float).ravel(),
+                "y": points[frames, :, 1].astype(float).ravel(),
+                "z": points[frames, :, 2].astype(float).ravel(),
+            }))
+        # Per frame, hand landmarks come before pose landmarks
+        df = pd.concat(blocks, ignore_index=True).sort_values(["frame", "type_order"], kind="stable")
+        df["global_timestamp_ms"] = self.global_timestamps[df["frame"].to_numpy()]
+        df["video_timestamp_ms"] = self.video_timestamps_ms[df["frame"].to_numpy()]
+        return df[LANDMARK_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,51 @@
+import argparse
+import itertools
+import time
+import numpy as np
+from landmark_extraction import extract_shard
+from angle_calculation import frame_angles
+
+BENCHMARK_FRAMES = 900  # 30 s of 30 fps video, long enough for tracking to matter
+
+def run(video_path: str, start_frame: int, stop_frame: int, stride: int, scale: float, roi: bool):
+    started = time.perf_counter()
+    landmarks = extract_shard(video_path, 0.0, start_frame, stop_frame, stride=stride, scale=scale, roi=roi)
+    landmarks.interpolate(stride)
+    return frame_angles(landmarks), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Wrist angle error against speedup for the Step 02 stride, scale and ROI options")
+    parser.add_argument("video", help="Session video to benchmark on")
+    parser.add_argument("--start", type=int, default=0, help="First frame of the benchmark clip")
+    parser.add_argument("--frames", type=int, default=BENCHMARK_FRAMES, help="Length of the benchmark clip in frames")
+    parser.add_argument("--strides", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--roi", action="store_true", help="Also run every combination with the ROI crop")
+    args = parser.parse_args()
+    stop_frame = args.start + args.frames
+
+    # Full frames through both models on every frame is the reference the options are measured against
+    reference, reference_time = run(args.video, args.start, stop_frame, 1, 1.0, False)
+    print(f"Reference: {len(reference)} frames in {reference_time:.1f} s ({len(reference) / reference_time:.1f} fps), "
+          f"angle on {np.count_nonzero(~np.isnan(reference))} frames")
+
+    print(f"{'stride':>6} {'scale':>5} {'roi':>3} {'time s':>7} {'speedup':>7} {'mean err':>8} {'p95 err':>7} {'max err':>7} {'coverage':>8}")
+    for stride, scale, roi in itertools.product(args.strides, args.scales, [False, True] if args.roi else [False]):
+        if (stride, scale, roi) == (1, 1.0, False):
+            angles, elapsed = reference, reference_time
+        else:
+            angles, elapsed = run(args.video, args.start, stop_frame, stride, scale, roi)
+        # Error in degrees over the frames both runs have an angle for
+        both = ~np.isnan(reference) & ~np.isnan(angles)
+        error = np.abs(angles[both] - reference[both])
+        if len(error):
+            mean_error, p95_error, max_error = error.mean(), np.percentile(error, 95), error.max()
+        else:
+            mean_error = p95_error = max_error = np.nan
+        # Share of the reference angles the option still produces
+        coverage = np.count_nonzero(both) / max(np.count_nonzero(~np.isnan(reference)), 1)
+        print(f"{stride:>6} {scale:>5.2f} {'yes' if roi else 'no':>3} {elapsed:>7.1f} {reference_time / elapsed:>6.2f}x "
+              f"{mean_error:>8.2f} {p95_error:>7.2f} {max_error:>7.2f} {coverage:>7.1%}")
+
+if __name__ == "__main__":
+    main()
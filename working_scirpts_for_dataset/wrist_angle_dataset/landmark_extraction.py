@@ -0,0 +1,286 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import mediapipe as mp
+import numpy as np
+from landmark_arrays import LandmarkArrays, result_points
+from frame_source import FrameSource
+
+WARMUP_FRAMES = 30  # Frames run before each shard (and thrown away) so hand/pose tracking has settled at the shard start
+VIDEO_FOURCC = "mp4v"
+CHECKPOINT_INTERVAL = 900  # Frames between landmark chunk flushes when checkpointing (30 s of 30 fps video)
+ROI_POSE_LANDMARKS = slice(11, 23)  # Shoulders, elbows, wrists and hand points of the pose model, the arm the angle is taken from
+ROI_MARGIN = 0.3  # The crop is the landmark box grown by this fraction of its size on every side
+ROI_EDGE = 0.1  # The crop only moves once landmarks come this close to its edge (fraction of the crop), a steady crop keeps tracking stable
+ROI_MIN_SIZE = 0.3  # Smallest crop as a fraction of the frame width and height, very small crops lose the pose
+
+mp_hands = mp.solutions.hands
+mp_drawing = mp.solutions.drawing_utils
+mp_pose = mp.solutions.pose
+
+def create_models():
+    hands = mp_hands.Hands(
+        static_image_mode=False,
+        max_num_hands=1,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+    pose = mp_pose.Pose(
+        static_image_mode=False,
+        model_complexity=1,
+        smooth_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+    return hands, pose
+
+def video_properties(video_path: str):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    return fps, frame_count, frame_size
+
+def draw_landmarks(frame, hand_results, pose_results) -> None:
+    if hand_results.multi_hand_landmarks:
+        for hand_landmarks in hand_results.multi_hand_landmarks:
+            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+    if pose_results.pose_landmarks:
+        mp_drawing.draw_landmarks(frame, pose_results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+
+def inference_frame(rgb_frame, crop, scale: float):
+    # Crop first, then downscale, MediaPipe returns coordinates normalised to whatever it was given
+    if crop is not None:
+        x0, y0, x1, y1 = crop
+        rgb_frame = np.ascontiguousarray(rgb_frame[y0:y1, x0:x1])
+    if scale != 1.0:
+        rgb_frame = cv2.resize(rgb_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return rgb_frame
+
+def uncrop(points, crop, frame_size: tuple):
+    # Crop normalised landmarks back to full frame coordinates, z is scaled like x as MediaPipe does
+    if points is None or crop is None:
+        return points
+    width, height = frame_size
+    x0, y0, x1, y1 = crop
+    points[:, 0] = (x0 + points[:, 0] * (x1 - x0)) / width
+    points[:, 1] = (y0 + points[:, 1] * (y1 - y0)) / height
+    points[:, 2] *= (x1 - x0) / width
+    return points
+
+def next_crop(crop, hand, pose, frame_size: tuple):
+    """Pixel crop (x0, y0, x1, y1) around the arm for the next frame, None to run on the full frame"""
+    found = [points for points in (hand, None if pose is None else pose[ROI_POSE_LANDMARKS]) if points is not None]
+    if not found:
+        # Lost the arm, search the whole frame again
+        return None
+    size = np.array(frame_size)
+    xy = np.concatenate(found)[:, :2] * size
+    low, high = xy.min(axis=0), xy.max(axis=0)
+    if crop is not None:
+        edge = ROI_EDGE * (np.array(crop[2:]) - crop[:2])
+        if (low >= np.array(crop[:2]) + edge).all() and (high <= np.array(crop[2:]) - edge).all():
+            return crop
+    half = np.maximum((high - low) * (0.5 + ROI_MARGIN), ROI_MIN_SIZE * size / 2)
+    center = (low + high) / 2
+    x0, y0 = np.clip(np.floor(center - half), 0, size).astype(int)
+    x1, y1 = np.clip(np.ceil(center + half), 0, size).astype(int)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+def write_json(path: str, data: dict) -> None:
+    # Write then rename, so a crash never leaves a half written file behind
+    with open(path + ".tmp", "w") as file:
+        json.dump(data, file)
+    os.replace(path + ".tmp", path)
+
+def load_checkpoint(checkpoint_dir: str, video_path: str, start_timestamp: float, start_frame: int,
+                    stop_frame: int = None, options: dict = None):
+    """Chunks saved by an earlier run of this shard, the frame to resume from and whether the shard had finished"""
+    state_path = os.path.join(checkpoint_dir, "checkpoint.json")
+    expected = {"video_path": video_path, "start_timestamp": start_timestamp, "start_frame": start_frame,
+                "stop_frame": stop_frame}
+    expected.update(options or {})
+    if os.path.exists(state_path):
+        with open(state_path) as file:
+            state = json.load(file)
+        if all(state.get(key) == value for key, value in expected.items()):
+            chunks = [LandmarkArrays.load(os.path.join(checkpoint_dir, name)) for name in state["chunks"]]
+            return chunks, state["next_frame"], state["complete"]
+    # No checkpoint, or one left by a different video, shard layout or inference options
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir)
+    write_json(state_path, dict(expected, chunks=[], next_frame=start_frame, complete=False))
+    return [], start_frame, False
+
+def save_checkpoint(checkpoint_dir: str, chunk: LandmarkArrays, complete: bool) -> None:
+    state_path = os.path.join(checkpoint_dir, "checkpoint.json")
+    with open(state_path) as file:
+        state = json.load(file)
+    if len(chunk):
+        name = f"chunk_{chunk.first_frame:08d}.npz"
+        chunk.save(os.path.join(checkpoint_dir, name + ".tmp.npz"))
+        os.replace(os.path.join(checkpoint_dir, name + ".tmp.npz"), os.path.join(checkpoint_dir, name))
+        state["chunks"].append(name)
+        state["next_frame"] = chunk.first_frame + len(chunk)
+    state["complete"] = complete
+    write_json(state_path, state)
+
+def clear_checkpoint(checkpoint_dir: str) -> None:
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+def clear_stale_shards(checkpoint_dir: str, shard_names: list) -> None:
+    # Shards of a run with a different worker count cover other frame ranges, they can never be resumed
+    if not os.path.isdir(checkpoint_dir):
+        return
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith("shard_") and name not in shard_names:
+            shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+
+def extract_shard(video_path: str, start_timestamp: float, start_frame: int = 0, stop_frame: int = None,
+                  warmup_frames: int = 0, output_video_path: str = None, checkpoint_dir: str = None,
+                  checkpoint_interval: int = CHECKPOINT_INTERVAL, stride: int = 1, scale: float = 1.0,
+                  roi: bool = False) -> LandmarkArrays:
+    """Landmarks for frames [start_frame, stop_frame), stop_frame None reads to the end of the video
+
+    With a checkpoint_dir, landmarks are flushed to disk every checkpoint_interval frames and a rerun
+    continues from the last flushed frame. The annotated video cannot be resumed, so it is not written then.
+
+    Only every stride-th frame of the video goes through the models, the others are left empty for
+    LandmarkArrays.interpolate. scale downscales the model input and roi crops it to the arm found on the
+    previous frame. Landmarks always come back in full frame coordinates.
+    """
+    chunks, resume_frame, complete = [], start_frame, False
+    if checkpoint_dir:
+        output_video_path = None
+        options = {"stride": stride, "scale": scale, "roi": roi}
+        chunks, resume_frame, complete = load_checkpoint(checkpoint_dir, video_path, start_timestamp, start_frame, stop_frame,
+                                                           options)
+        if complete:
+            return LandmarkArrays.concatenate(chunks)
+
+    hands, pose = create_models()
+    # Frames are decoded and converted to RGB on a prefetch thread while the models run
+    frames = FrameSource(video_path, max(0, resume_frame - warmup_frames), stop_frame)
+    fps = frames.fps
+    out = None
+    if output_video_path and stride == 1 and not roi:
+        out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*VIDEO_FOURCC), fps, frames.frame_size)
+
+    # Sized from the frame count estimate, LandmarkArrays grows if the video turns out longer
+    landmarks = LandmarkArrays(fps, start_timestamp, resume_frame, (stop_frame or frames.frame_count) - resume_frame)
+    flushed = 0
+    crop = None
+    for frame_idx, frame, rgb_frame in frames:
+        if frame_idx % stride:
+            if frame_idx >= resume_frame:
+                landmarks.skip()
+            continue
+
+        # Process the frame with MediaPipe Hands and Pose
+        model_frame = inference_frame(rgb_frame, crop, scale)
+        hand_results = hands.process(model_frame)
+        pose_results = pose.process(model_frame)
+        hand_points, pose_points = result_points(hand_results, pose_results)
+        hand_points = uncrop(hand_points, crop, frames.frame_size)
+        pose_points = uncrop(pose_points, crop, frames.frame_size)
+        if roi:
+            crop = next_crop(crop, hand_points, pose_points, frames.frame_size)
+
+        # Warm-up frames only prime the trackers, the previous shard (or run) owns their landmarks
+        if frame_idx >= resume_frame:
+            landmarks.add_points(hand_points, pose_points)
+            if out is not None:
+                draw_landmarks(frame, hand_results, pose_results)
+                out.write(frame)
+            if checkpoint_dir and len(landmarks) - flushed >= checkpoint_interval:
+                save_checkpoint(checkpoint_dir, landmarks.slice(flushed, len(landmarks)), False)
+                flushed = len(landmarks)
+
+    if out is not None:
+        out.release()
+    hands.close()
+    pose.close()
+    if checkpoint_dir:
+        save_checkpoint(checkpoint_dir, landmarks.slice(flushed, len(landmarks)), True)
+    landmarks.trim()
+    return LandmarkArrays.concatenate(chunks + [landmarks]) if chunks else landmarks
+
+def shard_dir_name(start: int, stop: int) -> str:
+    # The whole range names the shard, so a run with another worker count never picks up its checkpoint
+    return f"shard_{start}_{'end' if stop is None else stop}"
+
+def shard_ranges(frame_count: int, shards: int) -> list:
+    # The last shard is open ended, CAP_PROP_FRAME_COUNT is only an estimate for some containers
+    bounds = [frame_count * i // shards for i in range(shards)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def concatenate_videos(part_paths: list, output_video_path: str, fps: float, frame_size: tuple) -> None:
+    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*VIDEO_FOURCC), fps, frame_size)
+    for part_path in part_paths:
+        cap = cv2.VideoCapture(part_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+        os.remove(part_path)
+    out.release()
+
+def extract_landmarks(video_path: str, start_timestamp: float, output_video_path: str = None, workers: int = 1,
+                      warmup_frames: int = WARMUP_FRAMES, checkpoint_dir: str = None, stride: int = 1,
+                      scale: float = 1.0, roi: bool = False) -> LandmarkArrays:
+    """Run Hands and Pose over the video, split into `workers` frame-range shards processed in parallel
+
+    With a checkpoint_dir the extraction can be resumed after a crash, and the annotated video is
+    rendered from the landmarks once they are complete. Call clear_checkpoint once the result is saved.
+    The same happens with stride or roi, where the model output is not the final landmarks of each frame.
+    """
+    options = {"stride": stride, "scale": scale, "roi": roi}
+    rendered_video_path = None
+    if (checkpoint_dir or stride > 1 or roi) and output_video_path:
+        rendered_video_path, output_video_path = output_video_path, None
+
+    if workers <= 1:
+        ranges = [(0, None)]
+    else:
+        fps, frame_count, frame_size = video_properties(video_path)
+        ranges = shard_ranges(frame_count, workers)
+    if checkpoint_dir:
+        clear_stale_shards(checkpoint_dir, [shard_dir_name(start, stop) for start, stop in ranges])
+
+    if workers <= 1:
+        shard_dir = os.path.join(checkpoint_dir, shard_dir_name(0, None)) if checkpoint_dir else None
+        landmarks = extract_shard(video_path, start_timestamp, warmup_frames=warmup_frames,
+                                  output_video_path=output_video_path, checkpoint_dir=shard_dir, **options)
+    else:
+        part_paths = [None] * len(ranges)
+        if output_video_path:
+            root, extension = os.path.splitext(output_video_path)
+            part_paths = [f"{root}_part{i}{extension}" for i in range(len(ranges))]
+        shard_dirs = [os.path.join(checkpoint_dir, shard_dir_name(start, stop)) if checkpoint_dir else None
+                      for start, stop in ranges]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(extract_shard, video_path, start_timestamp, start, stop, warmup_frames, part_path, shard_dir,
+                                **options)
+                for (start, stop), part_path, shard_dir in zip(ranges, part_paths, shard_dirs)
+            ]
+            # Shards are merged in frame order, whatever order they finish in
+            landmarks = LandmarkArrays.concatenate([future.result() for future in futures])
+
+        if output_video_path:
+            concatenate_videos(part_paths, output_video_path, fps, frame_size)
+
+    landmarks.interpolate(stride)
+    if rendered_video_path:
+        # Imported here, landmark_rendering imports this module
+        from landmark_rendering import render_video
+        render_video(video_path, landmarks, rendered_video_path)
+    return landmarks
@@ -0,0 +1,40 @@
+import argparse
+import cv2
+from mediapipe.framework.formats import landmark_pb2
+from landmark_arrays import LandmarkArrays
+from landmark_extraction import mp_drawing, mp_hands, mp_pose, video_properties, VIDEO_FOURCC
+
+def landmark_list(points) -> landmark_pb2.NormalizedLandmarkList:
+    proto = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in points:
+        proto.landmark.add(x=float(x), y=float(y), z=float(z))
+    return proto
+
+def render_video(video_path: str, landmarks: LandmarkArrays, output_video_path: str) -> None:
+    """Redraw the annotated video from saved landmarks, so extraction itself can run without drawing"""
+    fps, _, frame_size = video_properties(video_path)
+    cap = cv2.VideoCapture(video_path)
+    if landmarks.first_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, landmarks.first_frame)
+    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*VIDEO_FOURCC), fps, frame_size)
+    for i in range(len(landmarks)):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        # Hands before pose, the same order Step 02 draws them in
+        if landmarks.hand_present[i]:
+            mp_drawing.draw_landmarks(frame, landmark_list(landmarks.hand[i]), mp_hands.HAND_CONNECTIONS)
+        if landmarks.pose_present[i]:
+            mp_drawing.draw_landmarks(frame, landmark_list(landmarks.pose[i]), mp_pose.POSE_CONNECTIONS)
+        out.write(frame)
+    cap.release()
+    out.release()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the annotated landmark video from a saved Step 02 landmark file")
+    parser.add_argument("video", help="Original session video")
+    parser.add_argument("landmarks", help="Landmark .npz file written by Step 02")
+    parser.add_argument("output", help="Annotated video to write")
+    args = parser.parse_args()
+    render_video(args.video, LandmarkArrays.load(args.landmarks), args.output)
+    print(f"Annotated video saved to: {args.output}")
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import pandas as pd
+
+DEFAULT_CACHE_DIR = "working_scirpts_for_dataset/wrist_angle_dataset/_output/cache"
+HASH_BLOCK_SIZE = 1 << 20  # Read files in 1 MiB blocks while hashing, videos are too big to read at once
+HASH_INDEX = "file_hashes.json"
+
+def atomic_copy(source: str, destination: str) -> None:
+    # Copy then rename, a crash never leaves a truncated output or cache entry behind
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+class PipelineCache:
+    """Step outputs stored under a key made from the step name, the content hash of every input and the step parameters
+
+    Inputs should include the code of the step, so editing a script or module also invalidates its entries.
+    File hashes are remembered by path, size and modification time, so a video is only hashed once.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, HASH_INDEX)
+        self.lock = threading.Lock()
+        self.hashes = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as file:
+                self.hashes = json.load(file)
+
+    def file_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            known = self.hashes.get(path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        with self.lock:
+            self.hashes[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+            # Several processes may share the cache, the last index written wins and the others just rehash
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.hashes, file)
+            os.replace(tmp_path, self.index_path)
+        return digest.hexdigest()
+
+    def key(self, step: str, inputs: list, params: dict = None) -> str:
+        digest = hashlib.sha256(step.encode())
+        for path in inputs:
+            digest.update(self.file_hash(path).encode())
+        digest.update(json.dumps(params or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, key: str, outputs: list) -> bool:
+        """Put the cached outputs in place, False when the key has no complete entry"""
+        manifest_path = os.path.join(self.entry_dir(key), "manifest.json")
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path) as file:
+            stored = json.load(file)["outputs"]
+        if not all(os.path.basename(path) in stored for path in outputs):
+            return False
+        for path in outputs:
+            name = os.path.basename(path)
+            # Outputs that already match are left alone
+            if os.path.exists(path) and self.file_hash(path) == stored[name]:
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            atomic_copy(os.path.join(self.entry_dir(key), name), path)
+        return True
+
+    def store(self, key: str, outputs: list, step: str = "", params: dict = None) -> None:
+        entry_dir = self.entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        stored = {}
+        for path in outputs:
+            atomic_copy(path, os.path.join(entry_dir, os.path.basename(path)))
+            stored[os.path.basename(path)] = self.file_hash(path)
+        # The manifest goes last, an entry without one is incomplete and never restored
+        tmp_path = os.path.join(entry_dir, f"manifest.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump({"step": step, "params": params or {}, "outputs": stored}, file)
+        os.replace(tmp_path, os.path.join(entry_dir, "manifest.json"))
+
+    def dataframe(self, step: str, inputs: list, params: dict, compute) -> pd.DataFrame:
+        """compute() for an in-script stage, or its cached result when the inputs and parameters are unchanged"""
+        key = self.key(step, inputs, params)
+        path = os.path.join(self.entry_dir(key), "result.pkl")
+        if os.path.exists(path):
+            return pd.read_pickle(path)
+        df = compute()
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return df
@@ -0,0 +1,96 @@
+import datetime
+import json
+import os
+import re
+import struct
+
+START_TIME_CACHE = "working_scirpts_for_dataset/wrist_angle_dataset/_output/video_start_times"  # One JSON file per video
+# First frame times read off the recorded clock by hand, the file name and metadata only give whole seconds
+KNOWN_START_TIMES = {
+    "TimeVideo_20230908_163442.mp4": "2023-09-08 16:34:42.565",
+}
+FILENAME_PATTERN = re.compile(r"TimeVideo_(\d{8}_\d{6})")  # Name the TimeVideo app gives its recordings, local start time
+MP4_EPOCH_OFFSET = 2082844800  # Seconds from 1904-01-01, where MP4/MOV times count from, to 1970-01-01
+
+def filename_start_time(video_path: str):
+    """Start time in the TimeVideo_YYYYMMDD_HHMMSS file name as unix seconds, None for other names"""
+    match = FILENAME_PATTERN.search(os.path.basename(video_path))
+    if not match:
+        return None
+    # Local time, the same way Step 02 used to read the manually entered date and time
+    return datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+
+def iter_boxes(file, start: int, end: int):
+    # (type, payload start, box end) of every MP4 box between start and end
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, kind = struct.unpack(">I4s", file.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", file.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield kind, offset + header_size, offset + size
+        offset += size
+
+def container_creation_time(video_path: str):
+    """creation_time of the MP4/MOV movie header (what ffprobe reports) as unix seconds, None when missing or unset
+
+    Only the box headers are read, the media data is skipped over, so this is quick on large videos.
+    """
+    with open(video_path, "rb") as file:
+        end = file.seek(0, os.SEEK_END)
+        for kind, start, stop in iter_boxes(file, 0, end):
+            if kind != b"moov":
+                continue
+            for kind, start, stop in iter_boxes(file, start, stop):
+                if kind == b"mvhd":
+                    file.seek(start)
+                    version = file.read(4)[0]
+                    if version == 1:
+                        creation = struct.unpack(">Q", file.read(8))[0]
+                    else:
+                        creation = struct.unpack(">I", file.read(4))[0]
+                    return float(creation - MP4_EPOCH_OFFSET) if creation else None
+    return None
+
+def video_start_timestamp(video_path: str, cache_dir: str = START_TIME_CACHE) -> float:
+    """Unix time of the first frame, from KNOWN_START_TIMES, the file name or else the container metadata
+
+    The file name and metadata only have one second resolution, add the video to KNOWN_START_TIMES or pass the
+    start time by hand where sub-second accuracy matters.
+    Results are kept in cache_dir, one file per video checked against its path, size and modification time, so
+    parallel runs on different videos never write the same file.
+    """
+    known_start = KNOWN_START_TIMES.get(os.path.basename(video_path))
+    if known_start is not None:
+        return datetime.datetime.strptime(known_start, "%Y-%m-%d %H:%M:%S.%f").timestamp()
+
+    key = os.path.abspath(video_path)
+    stat = os.stat(video_path)
+    cache_path = os.path.join(cache_dir, os.path.basename(video_path) + ".json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as file:
+            known = json.load(file)
+        if known["path"] == key and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["start_timestamp"]
+
+    source, start_timestamp = "filename", filename_start_time(video_path)
+    if start_timestamp is None:
+        source, start_timestamp = "container", container_creation_time(video_path)
+    if start_timestamp is None:
+        raise ValueError(f"No start time in the name or metadata of {video_path}, pass it by hand")
+
+    entry = {"path": key, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "start_timestamp": start_timestamp,
+             "source": source}
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written whole and renamed into place, a run on the same video at the same time writes the same entry
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(entry, file, indent=1)
+    os.replace(tmp_path, cache_path)
+    return start_timestamp